@@ -0,0 +1,169 @@
+"""
+Times database processing on synthetic v3.1 databases across scales, then every processor's process_all
+end to end over them, and appends the results, tagged with the current git commit, to
+benchmark_output/results.jsonl for comparison between commits
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+import utils
+import synthetic_database
+import clustering_result
+import database_processing
+import database_processing_v3
+import database_processing_v3_1
+
+this_dir = os.path.realpath(os.path.dirname(__file__)) + "/"
+bench_dir = this_dir + "benchmark_output/"
+results_file = bench_dir + "results.jsonl"
+
+# Arguments to synthetic_database.build for each scale
+scales = {
+    'small': dict(regions=1, techs=5, demands=1, periods=2),
+    'medium': dict(regions=2, techs=20, demands=3, periods=3),
+    'large': dict(regions=5, techs=40, demands=5, periods=4),
+}
+
+
+# Evenly spaced representative days, each standing in for the days nearest it
+def _period_set(n_periods: int) -> clustering_result.PeriodSet:
+
+    rep_days = np.linspace(0, 364, n_periods).round().astype(int)
+    nearest = np.abs(np.arange(365)[:, None] - rep_days[None, :]).argmin(axis=1)
+
+    periods = [utils.stringify_day(day + 1) for day in rep_days]
+    weights = pd.DataFrame(index=periods, data=np.bincount(nearest, minlength=n_periods), columns=['weight'])
+    return clustering_result.PeriodSet.from_sequence(weights, nearest)
+
+
+
+def _git_commit() -> str:
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=this_dir, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=this_dir, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+
+# Last recorded result for a scale and the same parameters from a different commit
+def _previous(scale: str, params: dict, n_periods: int, commit: str) -> dict | None:
+
+    if not os.path.exists(results_file): return None
+
+    previous = None
+    with open(results_file, 'r') as f:
+        for line in f:
+            result = json.loads(line)
+            if (result['scale'] == scale and result['params'] == params and result['n_periods'] == n_periods
+                and result['commit'] != commit):
+                previous = result
+    return previous
+
+
+
+# Appends a record to the results file and prints it against the previous one
+def _report(record: dict, repeats: int):
+
+    previous = _previous(record['scale'], record['params'], record['n_periods'], record['commit'])
+    with open(results_file, 'a') as f: f.write(json.dumps(record) + "\n")
+
+    print(f"\n{record['scale']}: {record['seconds_median']:.2f}s median, {record['seconds_min']:.2f}s min over {repeats} runs")
+    if previous is not None:
+        change = record['seconds_median'] / previous['seconds_median'] - 1
+        print(f"    {change:+.0%} against {previous['commit']} ({previous['seconds_median']:.2f}s)")
+
+
+
+def run(scale_names: list[str] = None, n_periods: int = 12, repeats: int = 3):
+
+    os.makedirs(bench_dir, exist_ok=True)
+    commit = _git_commit()
+
+    # Point every database processor at the benchmark directory and fixed representative periods
+    dp = database_processing_v3_1
+    for processor in (database_processing, database_processing_v3, database_processing_v3_1):
+        processor.input_dir = bench_dir + "input_sqlite/"
+        processor.output_dir = bench_dir + "output_sqlite/"
+    os.makedirs(dp.input_dir, exist_ok=True)
+    os.makedirs(dp.output_dir, exist_ok=True)
+
+    result = clustering_result.ClusteringResult(final_periods=n_periods, variants={n_periods: _period_set(n_periods)})
+    dp.init(result)
+
+    for scale in scale_names or scales.keys():
+
+        database = f"synthetic_{scale}"
+        in_file = dp.input_dir + database + ".sqlite"
+
+        # Input databases are only rebuilt if missing as the largest take a while
+        if not os.path.exists(in_file):
+            print(f"Generating {scale} synthetic database...")
+            synthetic_database.build(in_file, **scales[scale])
+
+        seconds = []
+        reports = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            reports = dp.process_database(database, force=True)
+            seconds.append(time.perf_counter() - start)
+
+        # Stage totals from the build report of the last repeat
+        stages = dict()
+        for s in reports[0]['stages']: stages[s['stage']] = stages.get(s['stage'], 0) + s['seconds']
+
+        record = {
+            'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'scale': scale,
+            'params': scales[scale],
+            'n_periods': n_periods,
+            'input_bytes': os.path.getsize(in_file),
+            'output_bytes': reports[0]['size_bytes'],
+            'seconds_min': min(seconds),
+            'seconds_median': statistics.median(seconds),
+            'stages': stages,
+            'config': {key: utils.config[key] for key in ('template_clone', 'fast_build', 'full_fk_check')},
+        }
+
+        _report(record, repeats)
+
+    # End to end as in process_all.py after clustering, every processor over every database in the input
+    # directory including initialisation, schema detection, manifests and the build summary
+    databases = sorted(os.path.splitext(file)[0] for file in os.listdir(dp.input_dir) if file.endswith(".sqlite"))
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        database_processing.process_all(True, result)
+        database_processing_v3.process_all(True, result)
+        database_processing_v3_1.process_all(True, result)
+        seconds.append(time.perf_counter() - start)
+
+    record = {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scale': 'process_all',
+        'params': {database: os.path.getsize(dp.input_dir + database + ".sqlite") for database in databases},
+        'n_periods': n_periods,
+        'seconds_min': min(seconds),
+        'seconds_median': statistics.median(seconds),
+        'config': {key: utils.config[key] for key in ('template_clone', 'fast_build', 'full_fk_check')},
+    }
+    _report(record, repeats)
+
+    print(f"\nResults appended to {results_file}\n")
+
+
+
+if __name__ == "__main__":
+
+    # e.g. python benchmark.py small medium
+    run([arg for arg in sys.argv[1:] if arg in scales] or None)
@@ -0,0 +1,73 @@
+"""
+Records what each processed database was built from so that databases whose inputs,
+representative periods and relevant configuration have not changed can be skipped
+"""
+
+import hashlib
+import json
+import os
+import utils
+
+manifest_name = "manifest.json"
+
+
+# Reads the manifest in an output directory. Empty if there is none yet
+def load(output_dir: str) -> dict:
+
+    manifest_file = output_dir + manifest_name
+    if not os.path.exists(manifest_file): return dict()
+
+    try:
+        with open(manifest_file, 'r') as f: return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Could not read {manifest_file}. Rebuilding all databases.")
+        print(e)
+        return dict()
+
+
+
+# Writes the manifest to a temporary file then swaps it in
+def save(output_dir: str, manifest: dict):
+
+    manifest_file = output_dir + manifest_name
+    with open(manifest_file + ".tmp", 'w') as f: json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+
+
+# Describes everything an output database depends on
+def entry(input_file: str, schema_version, periods: str, config_keys: list[str], schema_file: str = None) -> dict:
+
+    # Size and modification time rather than a content hash as input databases can be several GB
+    stat = os.stat(input_file)
+    config = {key: utils.config.get(key) for key in config_keys}
+
+    return {
+        'input': {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns},
+        'periods': _hash(periods),
+        'config': _hash(json.dumps(config, sort_keys=True, default=str)),
+        'schema': {
+            'version': list(schema_version) if isinstance(schema_version, tuple) else schema_version,
+            'hash': None if schema_file is None else _hash(open(schema_file, 'r').read()),
+        },
+    }
+
+
+
+# Whether the output database exists and was built from exactly this entry
+def is_current(manifest: dict, out_file: str, entry: dict) -> bool:
+
+    return os.path.exists(out_file) and manifest.get(os.path.basename(out_file)) == entry
+
+
+
+def record(output_dir: str, manifest: dict, out_file: str, entry: dict):
+
+    manifest[os.path.basename(out_file)] = entry
+    save(output_dir, manifest)
+
+
+
+def _hash(string: str) -> str:
+
+    return hashlib.sha256(string.encode()).hexdigest()
@@ -0,0 +1,90 @@
+"""
+Records wall time, rows written and output size for each stage of building an output database
+so that the stages and tables that dominate build time can be found as databases grow
+"""
+
+import json
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+import utils
+
+report_suffix = ".report.json"
+summary_name = "build_report.json"
+
+
+# Starts an empty report for one output database
+def start(out_file: str) -> dict:
+
+    return {
+        'database': os.path.basename(out_file),
+        'seconds': None,
+        'size_bytes': None,
+        'stages': [],
+        '_start': time.perf_counter(),
+    }
+
+
+
+# Times the enclosed block and counts the rows it inserted, updated or deleted through conn.
+# Rows are not counted for work done outside SQLite (conn None)
+@contextmanager
+def stage(report: dict, conn: sqlite3.Connection, name: str, table: str = None):
+
+    changes = 0 if conn is None else conn.total_changes
+    start = time.perf_counter()
+    yield
+    report['stages'].append({
+        'stage': name,
+        'table': table,
+        'seconds': round(time.perf_counter() - start, 6),
+        'rows': 0 if conn is None else conn.total_changes - changes,
+    })
+
+
+
+# Completes a report once the output database is closed and writes it next to the output
+def finish(report: dict, out_file: str) -> dict:
+
+    report['seconds'] = round(time.perf_counter() - report.pop('_start'), 6)
+    report['size_bytes'] = os.path.getsize(out_file) if os.path.exists(out_file) else None
+
+    if utils.config['build_report']:
+        with open(os.path.splitext(out_file)[0] + report_suffix, 'w') as f: json.dump(report, f, indent=2)
+
+    return report
+
+
+
+# Totals stage times and rows over all databases built in a run, writes them to the output
+# directory and prints the slowest stages
+def summarise(output_dir: str, reports: list[dict]):
+
+    if not reports or not utils.config['build_report']: return
+
+    stages: dict[str, dict] = dict()
+    tables: dict[str, dict] = dict()
+    for report in reports:
+        for s in report['stages']:
+            for totals, key in ((stages, s['stage']), (tables, s['table'])):
+                if key is None: continue
+                total = totals.setdefault(key, {'seconds': 0.0, 'rows': 0})
+                total['seconds'] += s['seconds']
+                total['rows'] += s['rows']
+
+    summary = {
+        'databases': [{key: report[key] for key in ('database', 'seconds', 'size_bytes')} for report in reports],
+        'seconds': sum(report['seconds'] for report in reports),
+        'size_bytes': sum(report['size_bytes'] or 0 for report in reports),
+        'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['seconds'])),
+        'tables': dict(sorted(tables.items(), key=lambda item: -item[1]['seconds'])),
+    }
+
+    summary_file = output_dir + summary_name
+    with open(summary_file, 'w') as f: json.dump(summary, f, indent=2)
+
+    print(f"\nBuilt {len(reports)} databases in {summary['seconds']:.1f}s. Slowest stages:")
+    for name, total in list(summary['stages'].items())[0:5]:
+        print(f"    {name}: {total['seconds']:.2f}s, {total['rows']} rows")
+    print(f"Build report written to {summary_file}")
@@ -1,15 +1,19 @@
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as pp
 import feature_selection as fi
 import tsam.timeseriesaggregation as tsam
 import utils
 import pca
+import clustering_result
 import os
 
 this_dir = os.path.realpath(os.path.dirname(__file__)) + "/"
 out_data = this_dir + "clustering_output_data/"
+pca_models_dir = out_data + "pca_models/" # not cleared by init so later runs can reuse the models
 
 initialised = False
+custom_feature_periods: list[int] = None # found on first use in each run
 
 
 
@@ -27,6 +31,7 @@ def init():
         'accuracy_indicators/',
         'recreated_timeseries/',
         'representative_periods/',
+        'sequences/',
         'duration_curve_plots/',
         'timeseries_plots/'
     ]
@@ -44,9 +49,15 @@ def init():
 
 
 
-def run(show_plots=False):
+# Returns the representative periods for every number of periods clustered
+def run(show_plots=False) -> clustering_result.ClusteringResult:
+
+    global custom_feature_periods
 
     init()
+    custom_feature_periods = None
+    fi.clear()
+    result = clustering_result.ClusteringResult(final_periods=utils.config['final_periods'])
 
     # Get selected timeseries to cluster over
     df_timeseries = collect_timeseries()
@@ -55,13 +66,27 @@ def run(show_plots=False):
         # Using PCA to get principal components first, then clustering over those
         print("Input timeseries to PCA:\n")
         print(df_timeseries)
-        df_pca = pca.get_principal_components(df_timeseries, utils.config['pca_groups'])
+        if utils.config['pca_mode'] == 'profile':
+            # One row of profile components per period, laid out over its hours for TSAM
+            df_features = pca.get_period_profile_components(df_timeseries, utils.config['pca_groups'], 24*utils.config['days_per_period'])
+            print(f"Reduced each period to {len(df_features.columns)} profile components")
+            df_pca = pack_period_features(df_features, 24*utils.config['days_per_period'])
+        elif utils.config['pca_reuse_models']:
+            # Score against the bases saved by an earlier run so components stay comparable
+            df_pca = pca.project(df_timeseries, pca.load_models(pca_models_dir, utils.config['pca_groups']))
+        else:
+            models = []
+            if utils.config['pca_chunk_rows'] is None: df_pca = pca.get_principal_components(df_timeseries, utils.config['pca_groups'], models, utils.config['pca_workers'])
+            else: df_pca = pca.get_principal_components_streaming(lambda cols: iter_timeseries(utils.config['pca_chunk_rows'], cols), utils.config['pca_groups'], models)
+            pca.save_models(models, pca_models_dir)
+            for model in models: print(f"PCA group {model.name}: {len(model.loadings)} components explain {model.explained_variance_ratio.sum():.1%} of variance")
         print("Clustering over principal components:\n")
         print(df_pca)
 
-        df_ts_std = pca.standardise(df_timeseries)
-
-        for group in utils.config['pca_groups']:
+        # These figures are only shown, never saved, so only standardise each group for them when shown
+        plot_groups = utils.config['pca_groups'] if show_plots and utils.config['pca_mode'] == 'hourly' else []
+        for group in plot_groups:
+            df_ts_std = pca.standardise(df_timeseries[group['columns']])
             pp.figure()
             pp.title(f"principal components for {group['name']}")
             pp.xlabel('time (h)')
@@ -104,16 +129,22 @@ def run(show_plots=False):
     colour = [1, 0, 0]
     for n_periods in test_periods:
 
-        if utils.config['use_pca']: df_predicted, sequence = cluster_days(df_timeseries=df_pca, n_periods=n_periods)
-        else: df_predicted, sequence = cluster_days(df_timeseries=df_timeseries, n_periods=n_periods)
-        if df_predicted is None: continue # How does this happen?
+        if utils.config['use_pca']: df_predicted, sequence, period_set = cluster_days(df_timeseries=df_pca, n_periods=n_periods)
+        else: df_predicted, sequence, period_set = cluster_days(df_timeseries=df_timeseries, n_periods=n_periods)
+        if df_predicted is None: continue # Too many feature periods to cluster
+
+        result.variants[n_periods] = period_set
 
         if utils.config['use_pca']:
-            # Have to manually reconstruct the representative timeseries because TSAM only ever saw principal components
-            data = []
-            for d in sequence: data.extend(df_timeseries.values[d*24:d*24+24])
+            # Have to manually reconstruct the representative timeseries because TSAM only ever saw principal components.
+            # Exported and scored in place of TSAM's, which are of the components
+            data = reconstruct(df_timeseries.to_numpy(), sequence, utils.config['days_per_period'])
             df_predicted = pd.DataFrame(columns=df_timeseries.columns, data=data, index=df_timeseries.index)
 
+            csv_name = f"{utils.config['clustering_method']}_{n_periods}p.csv"
+            df_predicted.to_csv(out_data + "recreated_timeseries/" + csv_name)
+            accuracy_indicators(df_timeseries, df_predicted).to_csv(out_data + "accuracy_indicators/" + csv_name)
+
         for ts in df_timeseries.columns:
             if n_periods == utils.config['final_periods']:
                 df_predicted[ts].sort_values(ascending=False).reset_index(drop=True).plot(label=f"*{n_periods} periods", ax=dur_axes[ts], lw=2, color=(0, 0.8, 0))
@@ -139,9 +170,11 @@ def run(show_plots=False):
         print("Showing plots.")
         pp.show()
 
+    return result
+
 
 
-def cluster_days(df_timeseries: pd.DataFrame, n_periods: int) -> pd.DataFrame:
+def cluster_days(df_timeseries: pd.DataFrame, n_periods: int) -> tuple[pd.DataFrame, list[int], clustering_result.PeriodSet]:
 
     method = utils.config['clustering_method']
     csv_name = f"{method}_{n_periods}p.csv"
@@ -154,39 +187,55 @@ def cluster_days(df_timeseries: pd.DataFrame, n_periods: int) -> pd.DataFrame:
         forced_days = [day + utils.config['day_to_index'] for day in utils.config['force_days']]
         forced_periods = [day // utils.config['days_per_period'] for day in forced_days] # does nothing if one-day periods
 
-    # Collect custom feature periods based on any configured in the list
-    forced_periods.extend([p for p in collect_custom_feature_periods() if p not in forced_periods])
+    # Collect custom feature periods based on any configured in the list. Multi-day force_days
+    # may land in the same period so each period is only counted once
+    forced_periods = list(dict.fromkeys(forced_periods + collect_custom_feature_periods()))
 
     # Making room for extreme periods
+    # Each max_deficit column adds a run of deficit_periods periods
     extreme_periods = utils.config['extreme_periods']
-    n_clusters = n_periods - len(forced_periods) - sum(len(val) for val in extreme_periods.values() if val)
+    n_extreme = sum(len(val) * (utils.config['deficit_periods'] if key == 'max_deficit' else 1) for key, val in extreme_periods.items() if val)
+    n_clusters = n_periods - len(forced_periods) - n_extreme
 
-    if n_clusters < 1:
+    # k_medoids_fixed clusters around the forced periods as fixed medoids, rather than
+    # adding them afterwards as new cluster centres like the extreme periods
+    fixed_medoids = method == 'k_medoids_fixed'
+    n_typical = n_periods - n_extreme if fixed_medoids else n_clusters
+
+    if n_typical < (max(1, len(forced_periods)) if fixed_medoids else 1):
         print("Too many feature periods! Nothing left for clustering. Skipping.")
-        return
+        return None, None, None
+
+    # Only passed when used so an older copy of timeseriesaggregation.py in tsam still works
+    tsam_options = dict(fixedMedoids=forced_periods) if fixed_medoids else dict()
+    if extreme_periods.get('max_ramp'): tsam_options['addRampMax'] = extreme_periods['max_ramp']
+    if extreme_periods.get('max_deficit'):
+        tsam_options['addDeficitMax'] = extreme_periods['max_deficit']
+        tsam_options['deficitPeriods'] = utils.config['deficit_periods']
 
     # Execute the clustering
     ts_agg = tsam.TimeSeriesAggregation(
         df_timeseries,
-        noTypicalPeriods = n_clusters,
+        noTypicalPeriods = n_typical,
         hoursPerPeriod = 24*utils.config['days_per_period'],
         clusterMethod = method,
         extremePeriodMethod='new_cluster_center',
-        addManual=forced_periods,
+        addManual=[] if fixed_medoids else forced_periods,
         addPeakMax=extreme_periods['max_peak'],
         addPeakMin=extreme_periods['min_peak'],
         addMeanMax=extreme_periods['max_mean'],
         addMeanMin=extreme_periods['min_mean'],
         resolution=1,
         solver='gurobi',
+        **tsam_options,
     )
 
     # Get the indices of chosen periods and their weights of the year
     weights = ts_agg.clusterPeriodNoOccur
     indices = ts_agg.clusterCenterIndices
 
-    if len(ts_agg.extremePeriods.values()) < n_periods - n_clusters:
-        print(f"Overlap between feature periods! Lost {n_periods - n_clusters - len(ts_agg.extremePeriods.values())} period(s).")
+    if len(ts_agg.extremePeriods.values()) < n_periods - n_typical:
+        print(f"Overlap between feature periods! Lost {n_periods - n_typical - len(ts_agg.extremePeriods.values())} period(s).")
 
     # Add feature period indices
     if n_periods == utils.config['final_periods']: print("Selected feature periods:")
@@ -199,22 +248,22 @@ def cluster_days(df_timeseries: pd.DataFrame, n_periods: int) -> pd.DataFrame:
     # Convert period indices to string period names as in the database
     days = [utils.index_to_season(d) for d in indices]
 
-    # Saving day selection and weights for all test numbers of periods to output data directory
     df_days = pd.DataFrame(index=days, data=weights.values(), columns=['weight']).sort_index()
-    df_days.to_csv(out_data + "representative_periods/" + csv_name)
 
-    sequence = [ts_agg.clusterCenterIndices[i] for i in ts_agg.clusterOrder]
+    # Period index of the representative period of each original period, and its position in df_days
+    cluster_order = np.asarray(ts_agg.clusterOrder)
+    sequence = np.asarray(indices)[cluster_order]
+    period_set = clustering_result.PeriodSet.from_sequence(df_days, df_days.index.get_indexer(days)[cluster_order])
 
-    # For the final number of periods, output to periods.csv for database processing
+    # Saving day selection, weights and run-length encoded sequence for all test numbers of periods to output data directory
+    period_set.to_csv(out_data + "representative_periods/" + csv_name, out_data + "sequences/" + csv_name)
+
+    # For the final number of periods, optionally export to periods.csv and sequence.csv
+    # so database processing can be run on its own later
     if n_periods == utils.config['final_periods']:
         print("\nOutput representative periods:\n")
         print(df_days.head(50), '\n')
-        df_days.to_csv(this_dir + "periods.csv")
-
-        # Also output the representative sequence
-        day_sequence = [utils.index_to_season(i) for i in sequence]
-        df_sequence = pd.DataFrame(index=range(len(day_sequence)), data=day_sequence, columns=['period'])
-        df_sequence.to_csv(this_dir + "sequence.csv")
+        if utils.config['export_periods']: period_set.to_csv(this_dir + "periods.csv", this_dir + "sequence.csv")
 
     # Output the timeseries data for the periods selected
     df_typ_periods = ts_agg.createTypicalPeriods()
@@ -230,7 +279,61 @@ def cluster_days(df_timeseries: pd.DataFrame, n_periods: int) -> pd.DataFrame:
     df_predicted = ts_agg.predictOriginalData()
     df_predicted.to_csv(out_data + "recreated_timeseries/" + csv_name)
     
-    return df_predicted, sequence
+    return df_predicted, sequence, period_set
+
+
+
+# Lays one row of features per period out over that period's hours so TSAM, which unstacks
+# each column into hoursPerPeriod features, sees each period as just its features. F features
+# take ceil(F / hours) columns, zero-padded, so TSAM's periods and sequence are unchanged
+def pack_period_features(df_features: pd.DataFrame, hours_per_period: int) -> pd.DataFrame:
+
+    n_periods, n_features = df_features.shape
+    n_cols = -(-n_features // hours_per_period)
+
+    packed = np.zeros((n_periods, n_cols * hours_per_period))
+    packed[:, :n_features] = df_features.to_numpy()
+    packed = packed.reshape(n_periods, n_cols, hours_per_period).transpose(0, 2, 1).reshape(-1, n_cols)
+
+    return pd.DataFrame(packed, columns=[f"profile_features_{c+1}" for c in range(n_cols)])
+
+
+
+# Rebuilds full-length timeseries from the original index of the representative period standing in for
+# each original period. Works on any number of columns or years of hourly rows. An incomplete last period
+# is completed from the start of the series as TSAM does, then cut back to the original length
+def reconstruct(values: np.ndarray, sequence: np.ndarray, days_per_period: int = 1) -> np.ndarray:
+
+    values = np.asarray(values)
+    hours = 24 * days_per_period
+    n_periods = -(-len(values) // hours)
+
+    if len(values) % hours: values_full = np.concatenate([values, values[:n_periods*hours - len(values)]])
+    else: values_full = values
+
+    periods = values_full.reshape(n_periods, hours, *values.shape[1:])
+    return periods[np.asarray(sequence)].reshape(-1, *values.shape[1:])[:len(values)]
+
+
+
+# RMSE, RMSE of the duration curve and MAE of each column, min-max normalised as TSAM does for its indicators
+def accuracy_indicators(df_original: pd.DataFrame, df_predicted: pd.DataFrame) -> pd.DataFrame:
+
+    original = df_original.to_numpy(dtype=float)
+    lowest = original.min(axis=0)
+    span = original.max(axis=0) - lowest
+    span[span == 0] = 1
+
+    original = (original - lowest) / span
+    predicted = (df_predicted.to_numpy(dtype=float) - lowest) / span
+    error = original - predicted
+    duration_error = np.sort(original, axis=0) - np.sort(predicted, axis=0)
+
+    return pd.DataFrame(index=df_original.columns, data={
+        'RMSE': np.sqrt((error ** 2).mean(axis=0)),
+        'RMSE_duration': np.sqrt((duration_error ** 2).mean(axis=0)),
+        'MAE': np.abs(error).mean(axis=0),
+    })
 
 
 
@@ -256,9 +359,33 @@ def collect_timeseries() -> pd.DataFrame:
 
 
 
-# Collects and returns custom feature periods identified by feature identification based on list configured in config
+# Reads the selected timeseries in chunks of chunk_rows rows, optionally only the given columns,
+# reading each csv file alongside the others so only one chunk of each is held at a time
+def iter_timeseries(chunk_rows: int, columns: list[str] = None):
+
+    files = [this_dir + "/".join(path) + '.csv' for path in get_all_files()]
+    cols = [file.split('/')[-1].split('.')[0] for file in files]
+    if columns is not None:
+        files, cols = zip(*[(file, col) for file, col in zip(files, cols) if col in columns])
+
+    readers = [pd.read_csv(file, index_col=0, chunksize=chunk_rows) for file in files]
+    start = 0
+    for chunks in zip(*readers):
+        df = pd.concat([chunk.astype(float) for chunk in chunks], axis='columns')
+        df.columns = cols
+        df.index = range(start, start + len(df.index))
+        start += len(df.index)
+        yield df
+
+
+
+# Collects and returns custom feature periods identified by feature identification based on list configured in config.
+# They do not depend on the number of periods so are found once per run and reused for every number tested
 def collect_custom_feature_periods() -> list[int]:
 
+    global custom_feature_periods
+
+    if custom_feature_periods is not None: return custom_feature_periods
     custom_feature_periods = []
 
     if utils.config['custom_features'] is None: return custom_feature_periods
@@ -266,10 +393,12 @@ def collect_custom_feature_periods() -> list[int]:
     # For each feature configured in the list, pass that dictionary to the relevant
     # feature identification method and get period indices in return
     for feature in utils.config['custom_features']:
-            
-            match feature['method']:
-                case 'max_mean_period': custom_feature_periods.extend(fi.max_mean_period(feature))
-    
+
+        if feature['method'] not in fi.methods:
+            print(f"Unknown custom feature method {feature['method']}. Feature skipped.")
+            continue
+        custom_feature_periods.extend(fi.methods[feature['method']](feature))
+
     return custom_feature_periods
 
 
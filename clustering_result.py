@@ -0,0 +1,104 @@
+"""
+Representative periods chosen by clustering. Handed directly from clustering to database
+processing in one process, or exported to and read back from periods.csv and sequence.csv
+"""
+
+import os
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+import utils
+
+this_dir = os.path.realpath(os.path.dirname(__file__)) + "/"
+clustering_dir = this_dir + "clustering_output_data/"
+
+
+# One set of representative periods. The chronological sequence is kept run-length encoded as
+# integer arrays, so long multi-year sequences cost no more than the runs in them
+@dataclass
+class PeriodSet:
+
+    weights: pd.DataFrame # index of period names, 'weight' column of original periods represented
+    run_periods: np.ndarray # position in weights of the representative period of each run in the sequence
+    run_lengths: np.ndarray # number of consecutive original periods in each run
+
+    @property
+    def periods(self) -> list[str]:
+        return list(self.weights.index)
+
+    # Representative period position of every original period, in order
+    @property
+    def sequence(self) -> np.ndarray:
+        return np.repeat(self.run_periods, self.run_lengths)
+
+    # Run-length encodes a sequence of positions in weights
+    @classmethod
+    def from_sequence(cls, weights: pd.DataFrame, sequence: np.ndarray) -> 'PeriodSet':
+
+        sequence = np.asarray(sequence, dtype=np.int32)
+        starts = np.flatnonzero(np.r_[True, sequence[1:] != sequence[:-1]])
+        lengths = np.diff(np.r_[starts, len(sequence)]).astype(np.int32)
+        return cls(weights=weights, run_periods=sequence[starts], run_lengths=lengths)
+
+    # Runs as 'period' name and 'count' columns
+    def runs(self) -> pd.DataFrame:
+
+        return pd.DataFrame({
+            'period': np.asarray(self.periods, dtype=object)[self.run_periods],
+            'count': self.run_lengths,
+        })
+
+    def to_csv(self, periods_file: str, sequence_file: str):
+
+        self.weights.to_csv(periods_file)
+        self.runs().to_csv(sequence_file)
+
+    # Reads runs of 'period' and 'count', or older sequence files with one 'period' row per original period
+    @classmethod
+    def from_csv(cls, periods_file: str, sequence_file: str) -> 'PeriodSet':
+
+        weights = pd.read_csv(periods_file, index_col=0)
+        df_sequence = pd.read_csv(sequence_file, index_col=0)
+        positions = weights.index.get_indexer(df_sequence['period'])
+        if (positions < 0).any(): raise ValueError(f"{sequence_file} has periods that are not in {periods_file}")
+
+        if 'count' not in df_sequence.columns: return cls.from_sequence(weights, positions)
+        return cls(weights=weights, run_periods=positions.astype(np.int32), run_lengths=df_sequence['count'].to_numpy(dtype=np.int32))
+
+
+
+# Every number of periods clustered in one run
+@dataclass
+class ClusteringResult:
+
+    final_periods: int
+    variants: dict[int, PeriodSet] = field(default_factory=dict) # {n_periods: PeriodSet}
+
+    @property
+    def final(self) -> PeriodSet:
+        return self.variants[self.final_periods]
+
+
+
+# Reads the exported final periods and, optionally, the other numbers of periods tested during clustering
+def load(test_periods: bool = False) -> ClusteringResult:
+
+    result = ClusteringResult(final_periods=utils.config['final_periods'])
+    result.variants[result.final_periods] = PeriodSet.from_csv(this_dir + "periods.csv", this_dir + "sequence.csv")
+
+    if not test_periods or utils.config['test_periods'] is None: return result
+
+    method = utils.config['clustering_method']
+    for n_periods in sorted(set(utils.config['test_periods'])):
+        if n_periods in result.variants: continue
+
+        csv_name = f"{method}_{n_periods}p.csv"
+        periods_file = clustering_dir + "representative_periods/" + csv_name
+        sequence_file = clustering_dir + "sequences/" + csv_name
+        if not os.path.exists(periods_file) or not os.path.exists(sequence_file):
+            print(f"No clustering output found for {n_periods} periods. Skipped.")
+            continue
+
+        result.variants[n_periods] = PeriodSet.from_csv(periods_file, sequence_file)
+
+    return result
@@ -0,0 +1,147 @@
+"""
+Checks that a v3.1 output database preserves annual demand (if demand_preservation is annual), the input's segfrac-weighted
+DSD shares, segment fractions and capacity-factor-weighted energy of its input, with one grouped query per check over both attached
+"""
+
+import sqlite3
+import os
+import sys
+import pandas as pd
+import utils
+
+report_suffix = ".consistency.csv"
+
+# Each query returns the key of a group, its expected value and the value in the output database
+checks = {
+
+    # Annual demand is carried over when demand_preservation is annual. Hourly preservation
+    # rescales it on purpose to what the representative periods hold, so it is not checked then
+    'demand': """
+        SELECT i.region || '/' || i.period || '/' || i.commodity AS key, i.total AS expected, o.total AS actual
+        FROM (SELECT region, period, commodity, SUM(demand) AS total FROM dbin.Demand GROUP BY region, period, commodity) AS i
+        LEFT JOIN (SELECT region, period, commodity, SUM(demand) AS total FROM dbout.Demand GROUP BY region, period, commodity) AS o
+        ON o.region = i.region AND o.period = i.period AND o.commodity = i.commodity""",
+
+    # Share of each demand in each representative season against the input's DSD of the days it was built from,
+    # weighted by the season's segment fractions and normalised over the representative seasons. Small
+    # differences are expected from DSD below dsd_threshold being zeroed
+    'dsd_share': """
+        SELECT i.region || '/' || i.period || '/' || i.demand_name || '/' || i.season AS key, i.share / NULLIF(i.total, 0) AS expected, o.share AS actual
+        FROM (
+            SELECT d.region, d.period, d.demand_name, m.season, SUM(d.dsd * s.segfrac) AS share,
+                SUM(SUM(d.dsd * s.segfrac)) OVER (PARTITION BY d.region, d.period, d.demand_name) AS total
+            FROM temp.slice_map AS m
+            JOIN dbout.TimeSegmentFraction AS s ON s.season = m.season AND s.tod = m.tod
+            JOIN dbin.DemandSpecificDistribution AS d ON d.period = s.period AND d.season = m.in_season AND d.tod = m.in_tod
+            GROUP BY d.region, d.period, d.demand_name, m.season
+        ) AS i
+        LEFT JOIN (
+            SELECT region, period, demand_name, season, SUM(dsd) AS share FROM dbout.DemandSpecificDistribution
+            GROUP BY region, period, demand_name, season
+        ) AS o
+        ON o.region = i.region AND o.period = i.period AND o.demand_name = i.demand_name AND o.season = i.season""",
+
+    # Segment fractions of each period sum to one
+    'segfrac_sum': """
+        SELECT period AS key, 1.0 AS expected, SUM(segfrac) AS actual
+        FROM dbout.TimeSegmentFraction
+        GROUP BY period""",
+
+    # Mean capacity factor over the year against its segfrac-weighted mean over the representative periods
+    'cf_tech': """
+        SELECT i.region || '/' || i.period || '/' || i.tech AS key, i.mean AS expected, o.mean AS actual
+        FROM (SELECT region, period, tech, AVG(factor) AS mean FROM dbin.CapacityFactorTech GROUP BY region, period, tech) AS i
+        LEFT JOIN (
+            SELECT c.region, c.period, c.tech, SUM(c.factor * s.segfrac) / SUM(s.segfrac) AS mean
+            FROM dbout.CapacityFactorTech AS c
+            JOIN dbout.TimeSegmentFraction AS s ON s.period = c.period AND s.season = c.season AND s.tod = c.tod
+            GROUP BY c.region, c.period, c.tech
+        ) AS o
+        ON o.region = i.region AND o.period = i.period AND o.tech = i.tech""",
+
+    'cf_process': """
+        SELECT i.region || '/' || i.period || '/' || i.tech || '/' || i.vintage AS key, i.mean AS expected, o.mean AS actual
+        FROM (SELECT region, period, tech, vintage, AVG(factor) AS mean FROM dbin.CapacityFactorProcess GROUP BY region, period, tech, vintage) AS i
+        LEFT JOIN (
+            SELECT c.region, c.period, c.tech, c.vintage, SUM(c.factor * s.segfrac) / SUM(s.segfrac) AS mean
+            FROM dbout.CapacityFactorProcess AS c
+            JOIN dbout.TimeSegmentFraction AS s ON s.period = c.period AND s.season = c.season AND s.tod = c.tod
+            GROUP BY c.region, c.period, c.tech, c.vintage
+        ) AS o
+        ON o.region = i.region AND o.period = i.period AND o.tech = i.tech AND o.vintage = i.vintage""",
+}
+
+
+# Runs every check and returns one row per check with its worst relative discrepancy.
+# The table is also written next to the output database
+def check(in_file: str, out_file: str) -> pd.DataFrame:
+
+    tolerance = utils.config['consistency_tolerance']
+
+    conn = sqlite3.connect(":memory:", uri=True)
+    utils.attach_input(conn, in_file, 'dbin')
+    utils.attach_input(conn, out_file, 'dbout')
+    _map_slices(conn)
+
+    rows = []
+    for name, query in checks.items():
+        if name == 'demand' and utils.config['demand_preservation'] != 'annual':
+            print(f"Skipped demand check: demand_preservation is {utils.config['demand_preservation']}, which rescales annual demand")
+            continue
+
+        try: df = pd.read_sql_query(query, conn)
+        except pd.errors.DatabaseError as e:
+            print(f"Skipped {name} check: {e}")
+            continue
+
+        rel_diff = (df['actual'] - df['expected']).abs() / df['expected'].abs().clip(lower=1e-12)
+        worst = rel_diff.idxmax() if rel_diff.notna().any() else None
+
+        rows.append({
+            'check': name,
+            'groups': len(df),
+            'missing': int(df['actual'].isna().sum()),
+            'over_tolerance': int((rel_diff > tolerance).sum()),
+            'max_rel_diff': None if worst is None else rel_diff[worst],
+            'worst_key': None if worst is None else df['key'][worst],
+        })
+
+    conn.close()
+
+    df_report = pd.DataFrame(rows, columns=['check', 'groups', 'missing', 'over_tolerance', 'max_rel_diff', 'worst_key']).set_index('check')
+    df_report.to_csv(os.path.splitext(out_file)[0] + report_suffix)
+
+    failed = df_report[(df_report['over_tolerance'] > 0) | (df_report['missing'] > 0)]
+    print(f"Consistency of {os.path.basename(out_file)}: {len(df_report) - len(failed)}/{len(df_report)} checks within {tolerance:.1%}")
+    if len(failed) > 0: print(failed.to_string())
+
+    return df_report
+
+
+
+# Maps each output season and tod to the input day and hour it was built from. A multi-day season
+# is labelled by its first and last day, e.g. D001-D004, and its tods run through its days in order
+def _map_slices(conn: sqlite3.Connection):
+
+    conn.execute("CREATE TEMP TABLE slice_map(season TEXT, tod TEXT, in_season TEXT, in_tod TEXT, PRIMARY KEY (season, tod))")
+
+    try:
+        seasons = [row[0] for row in conn.execute("SELECT DISTINCT season FROM dbout.TimeSeason").fetchall()]
+        tods = [row[0] for row in conn.execute("SELECT tod FROM dbout.TimeOfDay ORDER BY sequence").fetchall()]
+    except sqlite3.OperationalError as e:
+        print(f"Could not map output seasons to input days: {e}")
+        return
+
+    for season in seasons:
+        first, last = (utils.destringify_day(day) for day in (season.split("-") if "-" in season else (season, season)))
+        days = [utils.stringify_day(day) for day in range(first, last + 1)]
+        conn.executemany("INSERT INTO temp.slice_map VALUES(?, ?, ?, ?)", [
+            (season, tod, days[h // 24], utils.stringify_hour(h % 24 + 1)) for h, tod in enumerate(tods) if h // 24 < len(days)
+        ])
+
+
+
+if __name__ == "__main__":
+
+    # e.g. python consistency_check.py input_sqlite/canoe.sqlite output_sqlite/canoe_16d.sqlite
+    check(sys.argv[1], sys.argv[2])
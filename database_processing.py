@@ -5,23 +5,42 @@ Aligns a Temoa database with representative days configured in days.csv
 import sqlite3
 import os
 import pandas as pd
-import shutil
+import sys
 import utils
+import build_manifest
+import clustering_result
 
 this_dir = os.path.realpath(os.path.dirname(__file__)) + "/"
 input_dir = this_dir + "input_sqlite/"
 output_dir = this_dir + "output_sqlite/"
 
+# Configuration that changes the contents of output databases
+manifest_config_keys = [
+    'days_per_period',
+    'disaggregate_multiday',
+]
+
+# Tables that reference time season
+season_tables = [
+    'DemandSpecificDistribution',
+    'CapacityFactorTech',
+    'CapacityFactorProcess',
+    'MinSeasonalActivity',
+    'MaxSeasonalActivity',
+]
+
 df_periods: pd.DataFrame
 initialised = False
 
 
-def init():
+# Takes representative periods handed over from clustering or, if none, reads them from periods.csv
+def init(result: clustering_result.ClusteringResult = None):
 
     global df_periods, initialised
-    if initialised: return
+    if initialised and result is None: return
 
-    df_periods = pd.read_csv(this_dir + "periods.csv", index_col=0).astype(float)
+    if result is None: result = clustering_result.load()
+    df_periods = result.final.weights.astype(float)
     df_periods['weight'] = df_periods['weight'] / df_periods['weight'].sum()
 
     if utils.config['disaggregate_multiday'] and utils.config['days_per_period'] > 1:
@@ -42,18 +61,27 @@ def init():
 
 
 
-def process_all():
+def process_all(force: bool = False, result: clustering_result.ClusteringResult = None):
 
-    init()
+    init(result)
 
     databases = _get_sqlite_databases()
+    manifest = build_manifest.load(output_dir)
 
     for database in databases:
 
         if _get_schema_version(database) != 0: continue
 
+        # Skip databases built from the same inputs unless forced
+        out_file = output_dir + f"{database}.sqlite"
+        entry = build_manifest.entry(input_dir + f"{database}.sqlite", 0, df_periods.to_csv(), manifest_config_keys)
+        if not force and build_manifest.is_current(manifest, out_file, entry):
+            print(f"{database} is up to date. Skipped.")
+            continue
+
         print(f"Processing {database}...")
         process_database(database)
+        build_manifest.record(output_dir, manifest, out_file, entry)
 
     print("\nFinished.\n")
 
@@ -63,8 +91,9 @@ def process_database(database: str):
 
     init()
 
-    # Copy the input database to the output directory and connect
-    shutil.copy(input_dir + f"{database}.sqlite", output_dir + f"{database}.sqlite", )
+    # Copy the input database to the output directory, only keeping rows for days in the representative periods
+    days = [day for period in df_periods.index for day in period_to_days(period)]
+    utils.copy_database(input_dir + f"{database}.sqlite", output_dir + f"{database}.sqlite", 'season_name', days, season_tables)
 
     if utils.config['disaggregate_multiday']: n_hours = 24
     else: n_hours = 24*utils.config['days_per_period']
@@ -88,15 +117,6 @@ def process_multiday_periods(database, hours):
     conn = sqlite3.connect(output_dir + f"{database}.sqlite")
     curs = conn.cursor()
 
-    # Tables that reference time season
-    season_tables = [
-        'DemandSpecificDistribution',
-        'CapacityFactorTech',
-        'CapacityFactorProcess',
-        'MinSeasonalActivity',
-        'MaxSeasonalActivity'
-    ]
-
     # Empty the season reference table and add representative days back in
     curs.execute(f"DELETE FROM time_season")
     curs.execute(f"DELETE FROM time_of_day")
@@ -104,33 +124,52 @@ def process_multiday_periods(database, hours):
 
     for hour in hours: curs.execute(f"INSERT INTO time_of_day(t_day) VALUES('{hour}')")
 
-    # Delete unnecessary days for starters
-    all_days = []
-    for period in df_periods.index: 
-        for period in period_to_days(period): all_days.append(period)
+    # Map each day and hour of the representative periods to its period and hour within that period
+    curs.execute("""CREATE TEMP TABLE season_map(
+                old_season TEXT, old_tod TEXT, new_season TEXT, new_tod TEXT, weight REAL,
+                PRIMARY KEY (old_season, old_tod))""")
+    curs.executemany("INSERT INTO temp.season_map VALUES(?, ?, ?, ?, ?)", [
+        (day, utils.stringify_hour(h+1), period, hours[24*d + h], weight.iloc[0])
+        for period, weight in df_periods.iterrows()
+        for d, day in enumerate(period_to_days(period))
+        for h in range(24)
+    ])
 
+    # Delete unnecessary days for starters
     for table in season_tables:
-        curs.execute(f"DELETE FROM {table} WHERE season_name NOT IN {tuple(all_days)}")
+        curs.execute(f"DELETE FROM {table} WHERE season_name NOT IN (SELECT old_season FROM temp.season_map)")
+
+    # Aggregate Seasonal Activity tables by new period in one pass per table, summing over the days
+    # of each period into the rows of its first day then swapping those in
+    # NOTE this changes output from the old per-group UPDATE, which was filtered only on the first day so every
+    # group got the first group's sum. Each row now holds its own group's sum over the period's days
+    curs.execute("CREATE TEMP TABLE period_day(day TEXT PRIMARY KEY, period TEXT, first_day TEXT)")
+    curs.executemany("INSERT INTO temp.period_day VALUES(?, ?, ?)", [
+        (day, period, period_to_days(period)[0]) for period in df_periods.index for day in period_to_days(period)
+    ])
+
+    for table in ['MinSeasonalActivity','MaxSeasonalActivity']:
+        val_col = table[:3].lower() + 'act'
+        cols = [row[1] for row in curs.execute(f"PRAGMA table_info({table})").fetchall()]
+        select = ", ".join('d.period' if col == 'season_name' else 'g.total' if col == val_col else f'f.{col}' for col in cols)
+
+        curs.execute(f"CREATE TEMP TABLE staging AS SELECT * FROM {table} WHERE 0")
+        curs.execute(f"""INSERT INTO temp.staging({', '.join(cols)})
+                    SELECT {select}
+                    FROM {table} AS f
+                    JOIN temp.period_day AS d ON f.season_name = d.day AND d.day = d.first_day
+                    JOIN (
+                        SELECT t.regions, t.periods, t.tech, p.period AS new_season, SUM(t.{val_col}) AS total
+                        FROM {table} AS t JOIN temp.period_day AS p ON t.season_name = p.day
+                        GROUP BY t.regions, t.periods, t.tech, p.period
+                    ) AS g
+                    ON g.regions IS f.regions AND g.periods IS f.periods AND g.tech IS f.tech AND g.new_season = d.period""")
+        curs.execute(f"DELETE FROM {table}")
+        curs.execute(f"INSERT INTO {table}({', '.join(cols)}) SELECT {', '.join(cols)} FROM temp.staging")
+        curs.execute("DROP TABLE temp.staging")
 
     for period, weight in df_periods.iterrows():
 
-        period_days = period_to_days(period)
-
-        # Aggregate Seasonal Activity tables by new periods
-        for table in ['MinSeasonalActivity','MaxSeasonalActivity']:
-            val_col = table[:3].lower() + 'act'
-            df_seas = pd.read_sql_query(f"SELECT * FROM {table} WHERE season_name IN {period_days}", conn)
-            df_seas = df_seas.groupby(['regions','periods','tech'])
-            for grp in df_seas.groups:
-                curs.execute(f"""UPDATE {table}
-                            SET {val_col} = (SELECT SUM({val_col}) FROM {table} WHERE
-                                season_name IN {period_days}
-                                AND regions == '{grp[0]}'
-                                AND periods == {grp[1]}
-                                AND tech == '{grp[2]}'),
-                            season_name = '{period}'
-                            WHERE season_name == '{period_days[0]}'""")
-
         curs.execute(f"INSERT INTO time_season(t_season) VALUES('{period}')")
 
         # SegFrac
@@ -138,25 +177,20 @@ def process_multiday_periods(database, hours):
             curs.execute(f"""REPLACE INTO
                         SegFrac(season_name, time_of_day_name, segfrac, segfrac_notes)
                         VALUES('{period}', '{hour}', {weight.iloc[0] / len(hours)}, "Weight from clustering")""")
-        
-        curs.execute(f"""UPDATE DemandSpecificDistribution
-                    SET dsd = dsd * {weight.iloc[0]}
-                    WHERE season_name IN {period_days}""")
-        
-        # Rename days and hours
-        for table in ['DemandSpecificDistribution', 'CapacityFactorTech', 'CapacityFactorProcess']:
-            
-            for d in range(len(period_days)):
-                for h in range(24):
-                    curs.execute(f"""UPDATE {table}
-                                SET time_of_day_name = '{hours[24*d + h]}'
-                                WHERE season_name == '{period_days[d]}'
-                                AND time_of_day_name == '{utils.stringify_hour(h+1)}'""")
-                    
-            curs.execute(f"""UPDATE {table}
-                        SET season_name = '{period}'
-                        WHERE season_name IN {period_days}""")
-            
+
+    # Weight DSD and rename days and hours to their period, in one pass per table
+    curs.execute(f"""UPDATE DemandSpecificDistribution
+                SET dsd = dsd * m.weight, season_name = m.new_season, time_of_day_name = m.new_tod
+                FROM temp.season_map AS m
+                WHERE DemandSpecificDistribution.season_name = m.old_season
+                AND DemandSpecificDistribution.time_of_day_name = m.old_tod""")
+
+    for table in ['CapacityFactorTech', 'CapacityFactorProcess']:
+        curs.execute(f"""UPDATE {table}
+                    SET season_name = m.new_season, time_of_day_name = m.new_tod
+                    FROM temp.season_map AS m
+                    WHERE {table}.season_name = m.old_season
+                    AND {table}.time_of_day_name = m.old_tod""")
 
     # Delete any seasons that aren't in the representative periods
     for table in season_tables:
@@ -203,13 +237,7 @@ def process_single_day_periods(database, hours):
                     WHERE season_name == '{period}'""")
 
     # Delete any seasons that aren't in the representative days
-    for table in [
-        'DemandSpecificDistribution',
-        'CapacityFactorTech',
-        'CapacityFactorProcess',
-        'MinSeasonalActivity',
-        'MaxSeasonalActivity',
-    ]:
+    for table in season_tables:
         curs.execute(f"DELETE FROM {table} WHERE season_name NOT IN (SELECT t_season from time_season)")
 
     # Renormalise DSD
@@ -245,7 +273,7 @@ def _get_sqlite_databases():
 
 def _get_schema_version(database):
 
-    conn = sqlite3.connect(input_dir + f"{database}.sqlite")
+    conn = sqlite3.connect(utils.readonly_uri(input_dir + f"{database}.sqlite"), uri=True)
     curs = conn.cursor()
 
     tables = {t[0] for t in curs.execute("SELECT name FROM sqlite_schema").fetchall()}
@@ -259,7 +287,7 @@ def _get_schema_version(database):
 
 def period_to_days(period: str):
 
-    if "-" not in period: return (period)
+    if "-" not in period: return (period,)
     else:
     
         days = [utils.destringify_day(day) for day in period.split("-")]
@@ -270,4 +298,4 @@ def period_to_days(period: str):
 
 if __name__ == "__main__":
 
-    process_all()
\ No newline at end of file
+    process_all(force='--force' in sys.argv)
\ No newline at end of file
@@ -5,24 +5,45 @@ Aligns a Temoa database with representative days configured in days.csv
 import sqlite3
 import os
 import pandas as pd
-import shutil
 import utils
+import build_manifest
+import clustering_result
 import sys
 
 this_dir = os.path.realpath(os.path.dirname(__file__)) + "/"
 input_dir = this_dir + "input_sqlite/"
 output_dir = this_dir + "output_sqlite/"
 
+# Configuration that changes the contents of output databases
+manifest_config_keys = [
+    'days_per_period',
+    'disaggregate_multiday',
+    'demand_preservation',
+]
+
+# Tables that reference time season
+season_tables = [
+    'DemandSpecificDistribution',
+    'CapacityFactorTech',
+    'CapacityFactorProcess',
+    'MinSeasonalActivity',
+    'MaxSeasonalActivity',
+    'MinDailyCapacityFactor',
+    'MaxDailyCapacityFactor',
+]
+
 df_period: pd.DataFrame
 initialised = False
 
 
-def init():
+# Takes representative periods handed over from clustering or, if none, reads them from periods.csv
+def init(result: clustering_result.ClusteringResult = None):
 
     global df_period, initialised
-    if initialised: return
+    if initialised and result is None: return
 
-    df_period = pd.read_csv(this_dir + "periods.csv", index_col=0).astype(float)
+    if result is None: result = clustering_result.load()
+    df_period = result.final.weights.astype(float)
     df_period['weight'] = df_period['weight'] / df_period['weight'].sum()
 
     if utils.config['disaggregate_multiday'] and utils.config['days_per_period'] > 1:
@@ -43,24 +64,33 @@ def init():
 
 
 
-def process_all():
-    init()
+def process_all(force: bool = False, result: clustering_result.ClusteringResult = None):
+    init(result)
     databases = _get_sqlite_databases()
-    for database in databases: process_database(database)
+    for database in databases: process_database(database, force)
     print("\nFinished.\n")
 
 
 
-def process_database(database: str):
+def process_database(database: str, force: bool = False):
 
     if _get_schema_version(database) != (3, 0): return
 
     init()
 
+    # Skip databases built from the same inputs unless forced
+    manifest = build_manifest.load(output_dir)
+    out_file = output_dir + f"{database}.sqlite"
+    entry = build_manifest.entry(input_dir + f"{database}.sqlite", (3, 0), df_period.to_csv(), manifest_config_keys)
+    if not force and build_manifest.is_current(manifest, out_file, entry):
+        print(f"{database} is up to date. Skipped.")
+        return
+
     print(f"Processing {database}...")
 
-    # Copy the input database to the output directory and connect
-    shutil.copy(input_dir + f"{database}.sqlite", output_dir + f"{database}.sqlite", )
+    # Copy the input database to the output directory, only keeping rows for days in the representative periods
+    days = [day for period in df_period.index for day in period_to_days(period)]
+    utils.copy_database(input_dir + f"{database}.sqlite", output_dir + f"{database}.sqlite", 'season', days, season_tables)
 
     if utils.config['disaggregate_multiday']: n_hours = 24
     else: n_hours = 24*utils.config['days_per_period']
@@ -77,6 +107,8 @@ def process_database(database: str):
     conn.commit()
     conn.close()
 
+    build_manifest.record(output_dir, manifest, out_file, entry)
+
 
 
 def process_multiday_period(database, hours):
@@ -88,17 +120,6 @@ def process_multiday_period(database, hours):
     dsd_columns = [c[1] for c in curs.execute('PRAGMA table_info(DemandSpecificDistribution);').fetchall()]
     dsd = 'dds' if 'dds' in dsd_columns else 'dsd'
 
-    # Tables that reference time season
-    season_tables = [
-        'DemandSpecificDistribution',
-        'CapacityFactorTech',
-        'CapacityFactorProcess',
-        'MinSeasonalActivity',
-        'MaxSeasonalActivity',
-        'MinDailyCapacityFactor',
-        'MaxDailyCapacityFactor',
-    ]
-
 
     # Empty the season reference table and add representative days back in
     curs.execute(f"DELETE FROM TimeSeason")
@@ -108,35 +129,55 @@ def process_multiday_period(database, hours):
     for hour in hours: curs.execute(f"INSERT INTO TimeOfDay(tod) VALUES('{hour}')")
 
 
-    # Delete unnecessary days for starters
-    all_days = []
-    for period in df_period.index: 
-        for period in period_to_days(period): all_days.append(period)
+    # Map each day and hour of the representative periods to its period and hour within that period
+    curs.execute("""CREATE TEMP TABLE season_map(
+                old_season TEXT, old_tod TEXT, new_season TEXT, new_tod TEXT, weight REAL,
+                PRIMARY KEY (old_season, old_tod))""")
+    curs.executemany("INSERT INTO temp.season_map VALUES(?, ?, ?, ?, ?)", [
+        (day, utils.stringify_hour(h+1), period, hours[24*d + h], weight.iloc[0])
+        for period, weight in df_period.iterrows()
+        for d, day in enumerate(period_to_days(period))
+        for h in range(24)
+    ])
 
+    # Delete unnecessary days for starters
     all_tables = [t[0] for t in curs.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()]
     for table in season_tables:
-        if table in all_tables: curs.execute(f"DELETE FROM {table} WHERE season NOT IN {tuple(all_days)}")
-
+        if table in all_tables: curs.execute(f"DELETE FROM {table} WHERE season NOT IN (SELECT old_season FROM temp.season_map)")
+
+
+    # Aggregate Seasonal Activity tables by new period in one pass per table, summing over the days
+    # of each period into the rows of its first day then swapping those in
+    # NOTE this changes output from the old per-group UPDATE, which was filtered only on the first day so every
+    # group got the first group's sum. Each row now holds its own group's sum over the period's days
+    curs.execute("CREATE TEMP TABLE period_day(day TEXT PRIMARY KEY, period TEXT, first_day TEXT)")
+    curs.executemany("INSERT INTO temp.period_day VALUES(?, ?, ?)", [
+        (day, period, period_to_days(period)[0]) for period in df_period.index for day in period_to_days(period)
+    ])
+
+    for table in ['MinSeasonalActivity','MaxSeasonalActivity']:
+        if table not in all_tables: continue
+        val_col = table[:3].lower() + '_act'
+        cols = [row[1] for row in curs.execute(f"PRAGMA table_info({table})").fetchall()]
+        select = ", ".join('d.period' if col == 'season' else 'g.total' if col == val_col else f'f.{col}' for col in cols)
+
+        curs.execute(f"CREATE TEMP TABLE staging AS SELECT * FROM {table} WHERE 0")
+        curs.execute(f"""INSERT INTO temp.staging({', '.join(cols)})
+                    SELECT {select}
+                    FROM {table} AS f
+                    JOIN temp.period_day AS d ON f.season = d.day AND d.day = d.first_day
+                    JOIN (
+                        SELECT t.region, t.period, t.tech, p.period AS new_season, SUM(t.{val_col}) AS total
+                        FROM {table} AS t JOIN temp.period_day AS p ON t.season = p.day
+                        GROUP BY t.region, t.period, t.tech, p.period
+                    ) AS g
+                    ON g.region IS f.region AND g.period IS f.period AND g.tech IS f.tech AND g.new_season = d.period""")
+        curs.execute(f"DELETE FROM {table}")
+        curs.execute(f"INSERT INTO {table}({', '.join(cols)}) SELECT {', '.join(cols)} FROM temp.staging")
+        curs.execute("DROP TABLE temp.staging")
 
     for period, weight in df_period.iterrows():
 
-        period_days = period_to_days(period)
-
-        # Aggregate Seasonal Activity tables by new period
-        for table in ['MinSeasonalActivity','MaxSeasonalActivity']:
-            val_col = table[:3].lower() + '_act'
-            df_seas = pd.read_sql_query(f"SELECT * FROM {table} WHERE season IN {period_days}", conn)
-            df_seas = df_seas.groupby(['region','period','tech'])
-            for grp in df_seas.groups:
-                curs.execute(f"""UPDATE {table}
-                            SET {val_col} = (SELECT SUM({val_col}) FROM {table} WHERE
-                                season IN {period_days}
-                                AND region == '{grp[0]}'
-                                AND period == {grp[1]}
-                                AND tech == '{grp[2]}'),
-                            season = '{period}'
-                            WHERE season == '{period_days[0]}'""")
-
         curs.execute(f"INSERT INTO TimeSeason(season) VALUES('{period}')")
 
         # TimeSegmentFraction
@@ -144,25 +185,20 @@ def process_multiday_period(database, hours):
             curs.execute(f"""REPLACE INTO
                         TimeSegmentFraction(season, tod, segfrac, notes)
                         VALUES('{period}', '{hour}', {weight.iloc[0] / len(hours)}, "Weight from clustering")""")
-        
-        curs.execute(f"""UPDATE DemandSpecificDistribution
-                    SET {dsd} = {dsd} * {weight.iloc[0]} * 365
-                    WHERE season IN {period_days}""")
-        
-        # Rename days and hours
-        for table in ['DemandSpecificDistribution', 'CapacityFactorTech', 'CapacityFactorProcess']:
-            
-            for d in range(len(period_days)):
-                for h in range(24):
-                    curs.execute(f"""UPDATE {table}
-                                SET tod = '{hours[24*d + h]}'
-                                WHERE season == '{period_days[d]}'
-                                AND tod == '{utils.stringify_hour(h+1)}'""")
-                    
-            curs.execute(f"""UPDATE {table}
-                        SET season = '{period}'
-                        WHERE season IN {period_days}""")
-            
+
+    # Weight DSD and rename days and hours to their period, in one pass per table
+    curs.execute(f"""UPDATE DemandSpecificDistribution
+                SET {dsd} = {dsd} * m.weight * 365, season = m.new_season, tod = m.new_tod
+                FROM temp.season_map AS m
+                WHERE DemandSpecificDistribution.season = m.old_season
+                AND DemandSpecificDistribution.tod = m.old_tod""")
+
+    for table in ['CapacityFactorTech', 'CapacityFactorProcess']:
+        curs.execute(f"""UPDATE {table}
+                    SET season = m.new_season, tod = m.new_tod
+                    FROM temp.season_map AS m
+                    WHERE {table}.season = m.old_season
+                    AND {table}.tod = m.old_tod""")
 
     # Delete any seasons that aren't in the representative period
     for table in season_tables:
@@ -221,16 +257,6 @@ def process_single_day_period(database, hours):
                     WHERE season == '{period}'""")
 
     # Delete any seasons that aren't in the representative days
-    season_tables = [
-        'DemandSpecificDistribution',
-        'CapacityFactorTech',
-        'CapacityFactorProcess',
-        'MinSeasonalActivity',
-        'MaxSeasonalActivity',
-        'MinDailyCapacityFactor',
-        'MaxDailyCapacityFactor',
-    ]
-
     all_tables = [t[0] for t in curs.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()]
     for table in season_tables:
         if table in all_tables: curs.execute(f"DELETE FROM {table} WHERE season NOT IN (SELECT season from TimeSeason)")
@@ -275,7 +301,7 @@ def _get_sqlite_databases():
 
 def _get_schema_version(database):
 
-    conn = sqlite3.connect(input_dir + f"{database}.sqlite")
+    conn = sqlite3.connect(utils.readonly_uri(input_dir + f"{database}.sqlite"), uri=True)
     curs = conn.cursor()
 
     tables = {t[0] for t in curs.execute("SELECT name FROM sqlite_schema").fetchall()}
@@ -292,7 +318,7 @@ def _get_schema_version(database):
 
 def period_to_days(period: str):
 
-    if "-" not in period: return (period)
+    if "-" not in period: return (period,)
     else:
         days = [utils.destringify_day(day) for day in period.split("-")]
         days = [utils.stringify_day(day) for day in range(days[0],days[1]+1,1)]
@@ -302,7 +328,10 @@ def period_to_days(period: str):
 
 if __name__ == "__main__":
 
-    if len(sys.argv) <= 1: process_all()
+    force = '--force' in sys.argv # rebuild even if the manifest says a database is up to date
+    args = [arg for arg in sys.argv[1:] if arg != '--force']
+
+    if len(args) == 0: process_all(force)
     else:
-        process_database(sys.argv[1])
+        process_database(args[0], force)
         print("Finished.")
\ No newline at end of file
@@ -6,8 +6,14 @@ import sqlite3
 import os
 import pandas as pd
 import utils
+import build_manifest
+import build_report
+import clustering_result
+import consistency_check
 import sys
-import math
+import numpy as np
+import shutil
+import tempfile
 
 this_dir = os.path.realpath(os.path.dirname(__file__)) + "/"
 input_dir = input_dir = this_dir + "input_sqlite/"
@@ -15,7 +21,19 @@ output_dir = this_dir + "output_sqlite/"
 
 schema = this_dir + "canoe_schema_v3_1.sql"
 
+# Configuration that changes the contents of output databases
+manifest_config_keys = [
+    'days_per_period',
+    'disaggregate_multiday',
+    'demand_preservation',
+    'dsd_threshold',
+    'model_years',
+]
+
 df_period: pd.DataFrame
+period_set: clustering_result.PeriodSet
+variants: dict[int, tuple[pd.DataFrame, clustering_result.PeriodSet]] # {n_periods: (df_period, period_set)}
+templates: dict[str, str] = dict() # {database: template file}
 initialised = False
 
 # Need to copy these over first (and in order)
@@ -87,20 +105,45 @@ season_tables = {
     'SeasonLabel',
 }
 
+# Tables rewritten for the representative periods. Only these are checked for foreign key violations
+time_tables = {
+    'TimeOfDay',
+    'TimeSeason',
+    'TimeSeasonSequential',
+    'TimeSegmentFraction',
+}
+fk_check_tables = season_tables | time_tables | {'Demand'}
+
+
+# Takes representative periods handed over from clustering or, if none, reads them from periods.csv
+def init(result: clustering_result.ClusteringResult = None):
+
+    global df_period, period_set, variants, initialised
+    if initialised and result is None: return
+
+    if result is None: result = clustering_result.load(test_periods=utils.config['apply_test_periods'])
+
+    # Also apply the other numbers of periods tested during clustering
+    variants = dict()
+    for n_periods, variant in sorted(result.variants.items()):
+        if n_periods != result.final_periods and not utils.config['apply_test_periods']: continue
+        variants[n_periods] = (_prepare_weights(variant), variant)
+        if n_periods != result.final_periods: print(f"Also applying {n_periods} test periods.")
+
+    df_period, period_set = variants[result.final_periods]
 
-def init():
+    print("\nApplying the following periods to v3.1 databases:\n")
+    print(df_period)
+
+    initialised = True
+    print("\nInitialised database processing.\n")
 
-    global df_period, df_sequence, initialised
-    if initialised: return
 
-    df_period = pd.read_csv(this_dir + "periods.csv", index_col=0)
 
-    df_sequence = pd.read_csv(this_dir + "sequence.csv", index_col=0)
-    change_points = df_sequence['period'] != df_sequence['period'].shift()
-    group_id = change_points.cumsum()
-    collapsed = df_sequence.groupby(group_id, as_index=False).agg({'period': 'first'})
-    collapsed['count'] = df_sequence.groupby(group_id).size().values
-    df_sequence = collapsed
+# Weights of a set of representative periods as applied to the database
+def _prepare_weights(period_set: clustering_result.PeriodSet) -> pd.DataFrame:
+
+    df_period = period_set.weights.copy()
 
     # Split e.g. D001-D003 into D001, D002, D003
     if utils.config['disaggregate_multiday'] and utils.config['days_per_period'] > 1:
@@ -113,25 +156,24 @@ def init():
 
             df_period = df_period.drop(period, axis='index')
 
-    print("\nApplying the following periods to v3.1 databases:\n")
-    print(df_period)
-
-    initialised = True
-    print("\nInitialised database processing.\n")
+    return df_period
 
 
 
-def process_all():
-    init()
+def process_all(force: bool = False, result: clustering_result.ClusteringResult = None):
+    init(result)
     databases = _get_sqlite_databases()
-    for database in databases: process_database(database)
+    reports = []
+    for database in databases: reports += process_database(database, force)
+    build_report.summarise(output_dir, reports)
     print("\nFinished.\n")
 
 
 
-def process_database(database: str):
+# Returns a build report for each output database built
+def process_database(database: str, force: bool = False) -> list[dict]:
 
-    if _get_schema_version(database) != (3, 1): return
+    if _get_schema_version(database) != (3, 1): return []
 
     init()
 
@@ -143,24 +185,240 @@ def process_database(database: str):
     if n_hours < 100: hours = [utils.stringify_hour(hour+1) for hour in range(n_hours)]
     else: hours = [utils.stringify_day(hour+1).replace("D","H") for hour in range(n_hours)]
 
-    if utils.config['days_per_period'] == 1 or utils.config['disaggregate_multiday']: process_single_day_period(database, hours)
-    elif utils.config['days_per_period'] > 1:
-        print("Multiday periods are not currently supported by Temoa. Turn on dissaggregate_multiday.")
-        return
-        #process_multiday_period(db_file, hours)
+    reports = []
+    manifest = build_manifest.load(output_dir)
+    for df_period, period_set in variants.values():
+
+        # Skip databases built from the same inputs unless forced
+        out_file = _out_file(database, df_period)
+        entry = build_manifest.entry(
+            input_dir + database + '.sqlite',
+            (3, 1),
+            df_period.to_csv() + period_set.runs().to_csv(),
+            manifest_config_keys,
+            schema,
+        )
+        if not force and build_manifest.is_current(manifest, out_file, entry):
+            print(f"{os.path.basename(out_file)} is up to date. Skipped.")
+            continue
+
+        reports.append(process_periods(database, hours, df_period, period_set))
+        build_manifest.record(output_dir, manifest, out_file, entry)
+
+        if utils.config['consistency_check']: consistency_check.check(input_dir + database + '.sqlite', out_file)
+
+    _remove_template(database)
+
+    return reports
+
+
+
+# Builds one output database. Multi-day periods (more than 24 hours) each become a single season
+# of 24 x days tods rather than a run of single-day seasons
+def process_periods(database: str, hours: list, df_period: pd.DataFrame, period_set: clustering_result.PeriodSet) -> dict:
+
+    out_file = _out_file(database, df_period)
+    report = build_report.start(out_file)
+
+    conn = _open_output(database, out_file, report)
+    curs = conn.cursor() # Cursor object interacts with the sqlite db
+
+    _attach_input(conn, database)
+    conn.execute('PRAGMA foreign_keys = 0;') # Turn off foreign keys while copying over
 
+    in_tables = [t[0] for t in curs.execute("SELECT name FROM dbin.sqlite_master WHERE type='table';").fetchall()]
+
+    # Otherwise these are already in the cloned template
+    if not utils.config['template_clone']:
+        _copy_tables(curs, index_tables, in_tables, report, 'index_copy')
+        _copy_tables(curs, direct_copy_tables, in_tables, report, 'direct_copy')
+
+    # Selected periods and their weights, joined against rather than pasted into the SQL
+    curs.execute("CREATE TEMP TABLE IF NOT EXISTS rep_season(season TEXT PRIMARY KEY, weight REAL)")
+    curs.execute("DELETE FROM temp.rep_season")
+    curs.executemany("REPLACE INTO temp.rep_season(season, weight) VALUES(?, ?)", df_period['weight'].items())
 
+    multiday = len(hours) > 24
+    if multiday: _map_multiday_seasons(curs, df_period, hours)
 
-def process_single_day_period(database: str, hours: list):
+    for table in season_tables:
+        if table not in in_tables: continue # might be a db variant without the table
+        cols = [row[1] for row in curs.execute(f"PRAGMA table_info({table})").fetchall()]
+
+        if multiday:
+            with build_report.stage(report, conn, 'season_filter', table): _copy_multiday_table(curs, table, cols)
+            continue
+
+        # If the input can look up seasons by index, drive the join from the few selected seasons.
+        # Otherwise scan the input table once, probing the selected seasons by primary key
+        if _season_indexed(curs, table): join = f"temp.rep_season AS s CROSS JOIN dbin.{table} AS t"
+        else: join = f"dbin.{table} AS t CROSS JOIN temp.rep_season AS s"
+
+        with build_report.stage(report, conn, 'season_filter', table):
+            curs.execute(f"""REPLACE INTO main.{table}({', '.join(cols)})
+                        SELECT {', '.join('t.' + col for col in cols)}
+                        FROM {join} ON t.season = s.season""")
+
+    with build_report.stage(report, conn, 'time_tables'):
+        period_days = len(hours) // 24
+        total_days = df_period['weight'].sum() * period_days
+        curs.execute(f"REPLACE INTO MetaData VALUES('days_per_period', {total_days}, 'count of days in each period')")
+
+        for year in utils.config['model_years']:
+            for i, (period, weight) in enumerate(df_period.iterrows()):
+                for hour in hours:
+
+                    # TimeSegmentFraction
+                    curs.execute(f"""REPLACE INTO
+                                TimeSegmentFraction(period, season, tod, segfrac, notes)
+                                VALUES({year}, '{period}', '{hour}', {weight.iloc[0] * period_days / (len(hours) * total_days)}, "Weight from clustering")""")
+            
+                # TimeSeason
+                curs.execute(f"""REPLACE INTO
+                            TimeSeason(period, sequence, season)
+                            VALUES({year}, {i}, '{period}')""")
+
+        # TimeSeasonSequential, written straight from the run-length encoded sequence.
+        # Labels are zero-padded to the width of the number of runs, e.g. S00 to S11
+        n_runs = len(period_set.run_lengths)
+        seas_seq = np.char.add('S', np.char.zfill(np.arange(n_runs).astype(str), len(str(n_runs)))).tolist()
+        seasons = np.asarray(period_set.periods, dtype=object)[period_set.run_periods].tolist()
+        num_days = (period_set.run_lengths * period_days).tolist()
+        curs.executemany(
+            """REPLACE INTO TimeSeasonSequential(period, sequence, seas_seq, season, num_days, notes)
+            VALUES(?, ?, ?, ?, ?, 'Reconstructed original year from clustering')""",
+            [(year, i, seas_seq[i], seasons[i], num_days[i]) for year in utils.config['model_years'] for i in range(n_runs)],
+        )
+
+        # TimeOfDay. Replace the single-day hours of the template outright for multi-day periods
+        if multiday: curs.execute("DELETE FROM TimeOfDay")
+        for h, tod in enumerate(hours):
+            curs.execute(f'REPLACE INTO TimeOfDay(sequence, tod) VALUES({h+1}, "{tod}")')
+
+    # DemandSpecificDistribution
+    # This is renormalised to sum to 1 below
+    with build_report.stage(report, conn, 'dsd_weight', 'DemandSpecificDistribution'):
+        curs.execute("""UPDATE DemandSpecificDistribution
+                    SET dsd = dsd * (SELECT weight FROM temp.rep_season AS s WHERE s.season = DemandSpecificDistribution.season)""")
+        
+    # Renormalise DSD
+    with build_report.stage(report, conn, 'dsd_renormalise', 'DemandSpecificDistribution'):
+        df_dsd = pd.read_sql_query("SELECT * FROM DemandSpecificDistribution", conn)
+        df_dsd = df_dsd.groupby(['region','period','demand_name'])
+        for rpd in df_dsd.groups:
+
+            # Drop threshold lower percentile
+            df = df_dsd.get_group(rpd).sort_values('dsd').reset_index()
+
+            # This is a safety net for low numbers of clusters where you might catch
+            # a day with zero demand throughout, which is not normalisable
+            if df['dsd'].sum() == 0:
+                print(
+                    f"There was no DSD remaining for demand {rpd}! "
+                    "Filling with flatline demand for now but different periods "
+                    "should be used!"
+                )
+                flatline_fill = 1 / len(df)
+                df['dsd'] = flatline_fill
+                curs.execute(
+                    f"""UPDATE DemandSpecificDistribution 
+                    SET dsd = {flatline_fill}
+                    WHERE region = '{rpd[0]}' 
+                    AND period = '{rpd[1]}' 
+                    AND demand_name == '{rpd[2]}'"""
+                )
+
+            # Get a running proportion sum of DSD
+            df['run_sum'] = df['dsd'].cumsum()/df['dsd'].sum()
+            # Get the smallest DSD above thresh to zero out actual table
+            thresh_dsd = df['dsd'].loc[df['run_sum'] < utils.config['dsd_threshold']].max()
+        
+            # There might be nothing under the threshold if using few rep days
+            if not pd.isna(thresh_dsd):
+                # Set to zero where the proportion exceeds the threshold
+                # If there are duplicate dsd values on the threshold these are all left in
+                # This leaves everything in in the case of a flatline demand
+                df['dsd'] = df['dsd'].where(df['dsd'] >= thresh_dsd, 0)
+            
+                curs.execute(
+                    f"""UPDATE DemandSpecificDistribution 
+                    SET dsd = 0 
+                    WHERE region = '{rpd[0]}' 
+                    AND period = '{rpd[1]}' 
+                    AND demand_name == '{rpd[2]}' 
+                    AND dsd < {thresh_dsd}"""
+                )
+
+            # Renormalise
+            total_dsd = df['dsd'].sum()
+            curs.execute(f"""UPDATE DemandSpecificDistribution
+                        SET dsd = dsd / {total_dsd}
+                        WHERE region = '{rpd[0]}'
+                        AND period = '{rpd[1]}'
+                        AND demand_name == '{rpd[2]}'""")
+        
+            # If preserving absolute hourly values, adjust annual demand to sum of representative periods
+            if utils.config['demand_preservation'] == 'hourly':
+                curs.execute(f"""UPDATE Demand SET demand = demand * {total_dsd}
+                            WHERE region = '{rpd[0]}'
+                            AND period = '{rpd[1]}'
+                            AND commodity == '{rpd[2]}'""")
 
-    out_file = output_dir + database + f"_{len(df_period)}d.sqlite"
+    conn.commit()
+
+    # A fresh build or clone has no free pages to reclaim
+    if not utils.config['fast_build'] and not utils.config['template_clone']:
+        with build_report.stage(report, conn, 'vacuum'):
+            conn.execute("VACUUM;")
+            conn.commit()
+
+    conn.execute('PRAGMA FOREIGN_KEYS=1;')
+    with build_report.stage(report, conn, 'fk_check'):
+        _check_foreign_keys(conn, out_file)
+
+    if utils.config['fast_build']:
+        conn.execute("DETACH DATABASE dbin")
+        with build_report.stage(report, conn, 'flush'):
+            _flush(conn, out_file)
+
+    conn.close()
+
+    return build_report.finish(report, out_file)
+
+
+
+def _out_file(database: str, df_period: pd.DataFrame) -> str:
+
+    return output_dir + database + f"_{len(df_period)}d.sqlite"
+
+
+
+# Connects to a new, empty output database or a clone of the template
+def _open_output(database: str, out_file: str, report: dict) -> sqlite3.Connection:
+
+    # Build in memory and only write to disk once finished
+    if utils.config['fast_build']:
+        conn = sqlite3.connect(":memory:", uri=True)
+        if utils.config['template_clone']:
+            template = sqlite3.connect(_get_template(database, report))
+            with build_report.stage(report, conn, 'template_clone'): template.backup(conn)
+            template.close()
+        else:
+            with build_report.stage(report, conn, 'schema'): conn.executescript(open(schema, 'r').read())
+        return conn
+
+    # Clone the season-independent template then only write season and time tables
+    if utils.config['template_clone']:
+        template_file = _get_template(database, report)
+        with build_report.stage(report, None, 'template_clone'): shutil.copyfile(template_file, out_file)
+        return sqlite3.connect(out_file, uri=True)
 
     # Check if database exists or needs to be built
     build_db = not os.path.exists(out_file)
     
     # Connect to the new database file
-    conn = sqlite3.connect(out_file)
-    curs = conn.cursor() # Cursor object interacts with the sqlite db
+    conn = sqlite3.connect(out_file, uri=True)
+    curs = conn.cursor()
 
     # Build the database if it doesn't exist. Otherwise clear all data if forced
     if build_db: curs.executescript(open(schema, 'r').read())
@@ -170,144 +428,166 @@ def process_single_day_period(database: str, hours: list):
         curs.executescript(open(schema, 'r').read())
 
     conn.commit()
-    conn.execute(f"ATTACH DATABASE '{input_dir + database + '.sqlite'}' AS dbin") # Attach the input database
-    conn.execute('PRAGMA foreign_keys = 0;') # Turn off foreign keys while copying over
+    return conn
+
+
+
+# Writes a database built in memory to a temporary file then renames it into place
+# so that a crashed run never leaves a half-written database behind
+def _flush(conn: sqlite3.Connection, out_file: str):
+
+    fd, tmp_file = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(out_file))
+    os.close(fd)
+
+    try:
+        disk = sqlite3.connect(tmp_file)
+        conn.backup(disk)
+        disk.close()
+        os.replace(tmp_file, out_file)
+    except BaseException:
+        if os.path.exists(tmp_file): os.remove(tmp_file)
+        raise
+
+
+
+# Builds the season-independent tables of an input database once so each variant can be cloned from it
+def _get_template(database: str, report: dict) -> str:
+
+    if database in templates: return templates[database]
+
+    template_file = output_dir + f"{database}_template.sqlite.tmp"
+    if os.path.exists(template_file): os.remove(template_file)
+
+    conn = sqlite3.connect(":memory:" if utils.config['fast_build'] else template_file, uri=True)
+    curs = conn.cursor()
+    with build_report.stage(report, conn, 'schema'): curs.executescript(open(schema, 'r').read())
+
+    _attach_input(conn, database)
+    conn.execute('PRAGMA foreign_keys = 0;')
 
     in_tables = [t[0] for t in curs.execute("SELECT name FROM dbin.sqlite_master WHERE type='table';").fetchall()]
-    
-    for table in index_tables:
-        if table not in in_tables: continue
-        cols = str([row[1] for row in curs.execute(f"PRAGMA table_info({table})").fetchall()])[1:-1].replace("'","")
-        curs.execute(f"REPLACE INTO main.{table}({cols}) SELECT {cols} FROM dbin.{table}")
+    _copy_tables(curs, index_tables, in_tables, report, 'index_copy')
+    _copy_tables(curs, direct_copy_tables, in_tables, report, 'direct_copy')
 
-    for table in direct_copy_tables:
-        if table not in in_tables: continue # might be a db variant without the table
-        cols = str([row[1] for row in curs.execute(f"PRAGMA table_info({table})").fetchall()])[1:-1].replace("'","")
-        curs.execute(f"REPLACE INTO main.{table}({cols}) SELECT {cols} FROM dbin.{table}")
+    conn.commit()
+    conn.execute("DETACH DATABASE dbin")
+    if utils.config['fast_build']:
+        with build_report.stage(report, conn, 'template_flush'): _flush(conn, template_file)
+    conn.close()
 
-    periods = tuple(df_period.index.unique())
-    for table in season_tables:
+    templates[database] = template_file
+    return template_file
+
+
+
+def _remove_template(database: str):
+
+    template_file = templates.pop(database, None)
+    if template_file is not None and os.path.exists(template_file): os.remove(template_file)
+
+
+
+# Copies tables from the attached input database as they are
+def _copy_tables(curs: sqlite3.Cursor, tables: set, in_tables: list, report: dict, stage: str):
+
+    for table in tables:
         if table not in in_tables: continue # might be a db variant without the table
         cols = str([row[1] for row in curs.execute(f"PRAGMA table_info({table})").fetchall()])[1:-1].replace("'","")
-        curs.execute(f"REPLACE INTO main.{table}({cols}) SELECT {cols} FROM dbin.{table} WHERE season IN {periods}")
+        with build_report.stage(report, curs.connection, stage, table):
+            curs.execute(f"REPLACE INTO main.{table}({cols}) SELECT {cols} FROM dbin.{table}")
 
-    total_days = df_period['weight'].sum()
-    curs.execute(f"REPLACE INTO MetaData VALUES('days_per_period', {total_days}, 'count of days in each period')")
 
-    for year in utils.config['model_years']:
-        for i, (period, weight) in enumerate(df_period.iterrows()):
-            for hour in hours:
 
-                # TimeSegmentFraction
-                curs.execute(f"""REPLACE INTO
-                            TimeSegmentFraction(period, season, tod, segfrac, notes)
-                            VALUES({year}, '{period}', '{hour}', {weight.iloc[0] / (24 * total_days)}, "Weight from clustering")""")
-            
-            # TimeSeason
-            curs.execute(f"""REPLACE INTO
-                        TimeSeason(period, sequence, season)
-                        VALUES({year}, {i}, '{period}')""")
-
-        # TimeSeasonSequential
-        for i, row in df_sequence.iterrows():
-            zeros = math.floor(math.log10(len(df_sequence))) - (0 if i==0 else math.floor(math.log10(i)))
-            period_seq = f"S{'0'*zeros}{i}"
-            curs.execute(f"""REPLACE INTO
-                        TimeSeasonSequential(period, sequence, seas_seq, season, num_days, notes)
-                        VALUES({year}, {i}, '{period_seq}', '{row['period']}', {row['count']}, 'Reconstructed original year from clustering')""")
-            
-    # TimeOfDay
-    for h in range(24):
-        tod = f"H0{h+1}" if h+1 < 10 else f"H{h+1}"
-        curs.execute(f'REPLACE INTO TimeOfDay(sequence, tod) VALUES({h+1}, "{tod}")')
+# Maps each day and hour of the multi-day representative periods to its period and hour within that period
+def _map_multiday_seasons(curs: sqlite3.Cursor, df_period: pd.DataFrame, hours: list):
 
-    # DemandSpecificDistribution
-    # This is renormalised to sum to 1 below
-    for period, weight in df_period.iterrows():
-        curs.execute(f"""UPDATE DemandSpecificDistribution
-                    SET dsd = dsd * {weight.iloc[0]}
-                    WHERE season == '{period}'""")
-        
-    # Renormalise DSD
-    df_dsd = pd.read_sql_query("SELECT * FROM DemandSpecificDistribution", conn)
-    df_dsd = df_dsd.groupby(['region','period','demand_name'])
-    for rpd in df_dsd.groups:
-
-        # Drop threshold lower percentile
-        df = df_dsd.get_group(rpd).sort_values('dsd').reset_index()
-
-        # This is a safety net for low numbers of clusters where you might catch
-        # a day with zero demand throughout, which is not normalisable
-        if df['dsd'].sum() == 0:
-            print(
-                f"There was no DSD remaining for demand {rpd}! "
-                "Filling with flatline demand for now but different periods "
-                "should be used!"
-            )
-            flatline_fill = 1 / len(df)
-            df['dsd'] = flatline_fill
-            curs.execute(
-                f"""UPDATE DemandSpecificDistribution 
-                SET dsd = {flatline_fill}
-                WHERE region = '{rpd[0]}' 
-                AND period = '{rpd[1]}' 
-                AND demand_name == '{rpd[2]}'"""
-            )
-
-        # Get a running proportion sum of DSD
-        df['run_sum'] = df['dsd'].cumsum()/df['dsd'].sum()
-        # Get the smallest DSD above thresh to zero out actual table
-        thresh_dsd = df['dsd'].loc[df['run_sum'] < utils.config['dsd_threshold']].max()
-        
-        # There might be nothing under the threshold if using few rep days
-        if not pd.isna(thresh_dsd):
-            # Set to zero where the proportion exceeds the threshold
-            # If there are duplicate dsd values on the threshold these are all left in
-            # This leaves everything in in the case of a flatline demand
-            df['dsd'] = df['dsd'].where(df['dsd'] >= thresh_dsd, 0)
-            
-            curs.execute(
-                f"""UPDATE DemandSpecificDistribution 
-                SET dsd = 0 
-                WHERE region = '{rpd[0]}' 
-                AND period = '{rpd[1]}' 
-                AND demand_name == '{rpd[2]}' 
-                AND dsd < {thresh_dsd}"""
-            )
-
-        # Renormalise
-        total_dsd = df['dsd'].sum()
-        curs.execute(f"""UPDATE DemandSpecificDistribution
-                    SET dsd = dsd / {total_dsd}
-                    WHERE region = '{rpd[0]}'
-                    AND period = '{rpd[1]}'
-                    AND demand_name == '{rpd[2]}'""")
-        
-        # If preserving absolute hourly values, adjust annual demand to sum of representative periods
-        if utils.config['demand_preservation'] == 'hourly':
-            curs.execute(f"""UPDATE Demand SET demand = demand * {total_dsd}
-                        WHERE region = '{rpd[0]}'
-                        AND period = '{rpd[1]}'
-                        AND commodity == '{rpd[2]}'""")
+    curs.execute("""CREATE TEMP TABLE IF NOT EXISTS season_map(
+                old_season TEXT, old_tod TEXT, new_season TEXT, new_tod TEXT,
+                PRIMARY KEY (old_season, old_tod))""")
+    curs.execute("DELETE FROM temp.season_map")
+    curs.executemany("INSERT INTO temp.season_map VALUES(?, ?, ?, ?)", [
+        (day, utils.stringify_hour(h+1), period, hours[24*d + h])
+        for period in df_period.index
+        for d, day in enumerate(period_to_days(period))
+        for h in range(24)
+    ])
 
-    conn.commit()
 
-    conn.execute("VACUUM;")
-    conn.commit()
 
-    conn.execute('PRAGMA FOREIGN_KEYS=1;')
+# Copies a season table for multi-day periods, relabelling each day and hour to its period and hour
+# in one pass. Tables without a tod get one row per period, averaging their values over its days
+def _copy_multiday_table(curs: sqlite3.Cursor, table: str, cols: list):
+
+    if 'tod' in cols:
+        select = ', '.join('m.new_season' if col == 'season' else 'm.new_tod' if col == 'tod' else f't.{col}' for col in cols)
+        curs.execute(f"""REPLACE INTO main.{table}({', '.join(cols)})
+                    SELECT {select}
+                    FROM dbin.{table} AS t CROSS JOIN temp.season_map AS m
+                    ON t.season = m.old_season AND t.tod = m.old_tod""")
+        return
+
+    info = curs.execute(f"PRAGMA table_info({table})").fetchall()
+    keys = [f't.{row[1]}' for row in info if row[5] > 0 and row[1] != 'season'] + ['m.new_season']
+    values = [row[1] for row in info if row[5] == 0 and row[2] == 'REAL']
+
+    select = ', '.join('m.new_season' if col == 'season' else f'AVG(t.{col})' if col in values else f't.{col}' for col in cols)
+    curs.execute(f"""REPLACE INTO main.{table}({', '.join(cols)})
+                SELECT {select}
+                FROM dbin.{table} AS t
+                JOIN (SELECT DISTINCT old_season, new_season FROM temp.season_map) AS m
+                ON t.season = m.old_season
+                GROUP BY {', '.join(keys)}""")
+
+
+
+# Whether any index on an input table starts with the season column
+def _season_indexed(curs: sqlite3.Cursor, table: str) -> bool:
+
+    for index in curs.execute(f"PRAGMA dbin.index_list({table})").fetchall():
+        first_col = curs.execute(f"PRAGMA dbin.index_info('{index[1]}')").fetchone()
+        if first_col is not None and first_col[2] == 'season': return True
+
+    return False
+
+
+
+# Streams foreign key violations, printing up to fk_print_limit rows then counts per (table, referenced table)
+def _check_foreign_keys(conn: sqlite3.Connection, out_file: str):
+
+    if utils.config['full_fk_check']: checks = ['PRAGMA foreign_key_check;']
+    else:
+        # Only tables this database has, as the check fails on a missing one
+        tables = {t[0] for t in conn.execute("SELECT name FROM main.sqlite_master WHERE type='table';").fetchall()}
+        checks = [f'PRAGMA foreign_key_check("{table}");' for table in sorted(fk_check_tables & tables)]
+
+    print_limit = utils.config['fk_print_limit']
+    counts: dict[tuple[str, str], int] = dict()
+
     try:
-        data = conn.execute('PRAGMA FOREIGN_KEY_CHECK;').fetchall()
-        if data:
-            for row in data:
-                print(f'{row}')
-            print('(Table, Row ID, Reference Table, (fkid) )')
-            print(f'The above foreign keys failed to validate for {out_file}')
+        for check in checks:
+            for row in conn.execute(check):
+                if sum(counts.values()) < print_limit: print(f'{row}')
+                counts[(row[0], row[2])] = counts.get((row[0], row[2]), 0) + 1
     except sqlite3.OperationalError as e:
         print(f'Foreign keys failed on activation for {out_file}. Something may be wrong with the schema.')
         print(e)
+        return
+
+    if not counts: return
+
+    n_violations = sum(counts.values())
+    if n_violations > print_limit: print(f'... and {n_violations - print_limit} more')
+    print('(Table, Row ID, Reference Table, (fkid) )')
+    print(f'The above foreign keys failed to validate for {out_file}')
+    for (table, parent), count in sorted(counts.items()):
+        print(f'    {table} -> {parent}: {count}')
 
-    conn.close()
+
+
+# Attaches the input database read-only and memory-mapped
+def _attach_input(conn: sqlite3.Connection, database: str):
+
+    utils.attach_input(conn, input_dir + database + '.sqlite', 'dbin')
 
 
 
@@ -329,7 +609,7 @@ def _get_sqlite_databases():
 
 def _get_schema_version(database):
 
-    conn = sqlite3.connect(input_dir + f"{database}.sqlite")
+    conn = sqlite3.connect(utils.readonly_uri(input_dir + f"{database}.sqlite"), uri=True)
     curs = conn.cursor()
 
     tables = {t[0] for t in curs.execute("SELECT name FROM sqlite_schema").fetchall()}
@@ -346,7 +626,7 @@ def _get_schema_version(database):
 
 def period_to_days(period: str):
 
-    if "-" not in period: return (period)
+    if "-" not in period: return (period,)
     else:
         days = [utils.destringify_day(day) for day in period.split("-")]
         days = [utils.stringify_day(day) for day in range(days[0],days[1]+1,1)]
@@ -356,7 +636,10 @@ def period_to_days(period: str):
 
 if __name__ == "__main__":
 
-    if len(sys.argv) <= 1: process_all()
+    force = '--force' in sys.argv # rebuild even if the manifest says a database is up to date
+    args = [arg for arg in sys.argv[1:] if arg != '--force']
+
+    if len(args) == 0: process_all(force)
     else:
-        process_database(sys.argv[1])
+        process_database(args[0], force)
         print("Finished.")
\ No newline at end of file
@@ -1,48 +1,99 @@
+import os
+import numpy as np
 import pandas as pd
 import utils
 
+this_dir = os.path.realpath(os.path.dirname(__file__)) + "/"
+
+# Timeseries read for feature identification, by name e.g. ontario/net_load. Each is read
+# from disk once per clustering run, call clear() to read them again
+sources: dict[str, np.ndarray] = dict()
+
+
+def clear():
+
+    sources.clear()
+
+
 
 # Returns the period index (may be multi-day) with the highest mean value of a given timeseries
 def max_mean_period(feature_config: dict):
 
-    df_timeseries = pd.read_csv(f"timeseries/{feature_config['timeseries']}.csv", index_col=0)
+    return _select(feature_config, lambda blocks: np.nanmean(blocks, axis=1).argmax())
+
+
+# Returns the period index with the lowest mean value of a given timeseries
+def min_mean_period(feature_config: dict):
+
+    return _select(feature_config, lambda blocks: np.nanmean(blocks, axis=1).argmin())
+
+
+# Returns the period index containing the highest single value of a given timeseries
+def max_peak_period(feature_config: dict):
+
+    return _select(feature_config, lambda blocks: np.nanmax(blocks, axis=1).argmax())
+
+
+# Returns the period index containing the largest hour to hour change, up or down, of a given timeseries
+def max_ramp_period(feature_config: dict):
+
+    return _select(feature_config, lambda blocks: np.nanmax(np.abs(np.diff(blocks, axis=1)), axis=1).argmax())
+
+
+# Returns the period index with the lowest mean net load, the timeseries less all those listed under subtract
+def min_net_load_period(feature_config: dict):
+
+    if not feature_config.get('subtract'):
+        print("Tried to add a min_net_load_period feature without any timeseries to subtract. Feature skipped.")
+        return []
+
+    return _select(feature_config, lambda blocks: np.nanmean(blocks, axis=1).argmin())
+
+
+# Feature identification methods by the name used in the custom_features config
+methods = {
+    'max_mean_period': max_mean_period,
+    'min_mean_period': min_mean_period,
+    'max_peak_period': max_peak_period,
+    'max_ramp_period': max_ramp_period,
+    'min_net_load_period': min_net_load_period,
+}
+
+
+
+# Splits the configured timeseries, less any listed under subtract, into consecutive periods of
+# days_in_period days as rows of one array. Picks one with the given function of that array
+# and converts it to the indices of the typical periods it covers
+def _select(feature_config: dict, pick) -> list[int]:
 
     n_days = feature_config['days_in_period']
-    total_periods = len(df_timeseries) // (24*n_days) # number of n-day periods in the timeseries
 
     if n_days % utils.config['days_per_period'] != 0:
-        print("Tried to add a max_mean_period feature but length of typical periods did not fit "
+        print(f"Tried to add a {feature_config['method']} feature but length of typical periods did not fit "
              "neatly inside length of feature period. Would cause indexing issues. Feature skipped.")
         return []
     else: typ_per_feature = n_days // utils.config['days_per_period'] # how many typical periods fit inside this feature period?
 
-    # Get the n_day period with highest mean value
-    max_mean = 0
-    max_index = 0
-    for p in range(total_periods):
-            
-            mean = period_mean(p, df_timeseries, n_days)
+    values = _source(feature_config['timeseries'])
+    for name in feature_config.get('subtract') or []:
+        values = values - _source(name)
 
-            # New high score
-            if mean > max_mean:
-                max_index = p
-                max_mean = mean
+    # One row per n_day period, dropping any incomplete period at the end
+    hours = 24*n_days
+    total_periods = len(values) // hours # number of n-day periods in the timeseries
+    blocks = values[:total_periods*hours].reshape(total_periods, hours)
 
-    # Convert to indices in the context of typical periods -> may be different length periods
-    indices = list(range(typ_per_feature*max_index, typ_per_feature*max_index+typ_per_feature))
-    return indices
+    index = int(pick(blocks))
 
+    # Convert to indices in the context of typical periods -> may be different length periods
+    return list(range(typ_per_feature*index, typ_per_feature*index+typ_per_feature))
 
-# Get the mean value of a timeseries
-def period_mean(p, df_timeseries, days_per_period):
 
-    start_index = 24*days_per_period*p
-    end_index = start_index + 24*days_per_period - 1
+# Values of a timeseries csv, read on first use
+def _source(name: str) -> np.ndarray:
 
-    # This period goes beyond the end of the timeseries so quit
-    if (end_index >= len(df_timeseries)):
-        print(p, end_index, len(df_timeseries))
-        return
+    if name not in sources:
+        df = pd.read_csv(this_dir + f"timeseries/{name}.csv", index_col=0)
+        sources[name] = df.iloc[:, 0].to_numpy(dtype=float)
 
-    # Otherwise return the mean
-    return df_timeseries.iloc[start_index:end_index].mean().iloc[0]
\ No newline at end of file
+    return sources[name]
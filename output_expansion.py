@@ -0,0 +1,187 @@
+"""
+Expands hourly results of a solved v3.1 database from representative periods back to the full year,
+following the chronological sequence in TimeSeasonSequential. Writes to a new SQLite database or,
+with pyarrow installed, Parquet files, streaming one region and tech at a time. Flows are energy over
+the whole slice so are spread evenly over the hours it stands in for, storage levels are states so are not
+"""
+
+import sqlite3
+import os
+import sys
+import numpy as np
+import utils
+
+# Hourly output tables expanded to the full year
+expanded_tables = [
+    'OutputFlowOut',
+    'OutputFlowIn',
+    'OutputStorageLevel',
+    'OutputCurtailment',
+]
+
+# Value column of each table, and whether it is energy over the slice to be divided between its hours
+value_columns = {
+    'OutputFlowOut': ('flow', True),
+    'OutputFlowIn': ('flow', True),
+    'OutputStorageLevel': ('level', False),
+    'OutputCurtailment': ('curtailment', True),
+}
+
+
+def expand(solved_file: str, out_path: str = None, parquet: bool = False, chunk_rows: int = None):
+
+    if parquet:
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("Writing Parquet needs pyarrow. Install it or expand to SQLite instead.")
+
+    if chunk_rows is None: chunk_rows = utils.config['expansion_chunk_rows']
+    if out_path is None: out_path = os.path.splitext(solved_file)[0] + ("_hourly" if parquet else "_hourly.sqlite")
+
+    conn = sqlite3.connect(":memory:" if parquet else out_path)
+    utils.attach_input(conn, solved_file, 'src')
+
+    n_hours = _map_hours(conn)
+    print(f"Expanding {os.path.basename(solved_file)} to {n_hours} hours per period...")
+
+    if parquet: os.makedirs(out_path, exist_ok=True)
+
+    src_tables = [t[0] for t in conn.execute("SELECT name FROM src.sqlite_master WHERE type='table'").fetchall()]
+    for table in expanded_tables:
+        if table not in src_tables: continue
+
+        info = conn.execute(f"PRAGMA src.table_info({table})").fetchall()
+        cols = [(row[1], row[2].upper()) for row in info if row[1] not in ('season', 'tod')] + [('hour', 'INTEGER')]
+        value_col, is_energy = value_columns[table]
+
+        def column(col: str) -> str:
+            if col == 'hour': return 'm.hour'
+            if col == value_col and is_energy: return f'o.{col} * m.share AS {col}'
+            return f'o.{col}'
+
+        # Each region and tech is read straight from the solved table so no more than one is held at once
+        groups = conn.execute(f"SELECT DISTINCT region, tech FROM src.{table}").fetchall()
+        select = f"""SELECT {', '.join(column(col) for col, _ in cols)}
+                    FROM src.{table} AS o CROSS JOIN temp.hour_map AS m
+                    ON m.period = o.period AND m.season = o.season AND m.tod = o.tod
+                    WHERE o.region = ? AND o.tech = ?"""
+
+        value_idx = [col for col, _ in cols].index(value_col)
+        if parquet: n_rows, totals = _write_parquet(conn, select, groups, cols, value_idx, out_path + f"/{table}.parquet", chunk_rows)
+        else: n_rows, totals = _write_sqlite(conn, select, groups, cols, value_col, table + "Hourly")
+
+        print(f"    {table}: {n_rows} hourly rows")
+        if is_energy: _check_totals(conn, table, value_col, totals)
+
+    conn.close()
+    print(f"Expanded results written to {out_path}")
+
+
+
+# Maps each representative (period, season, tod) to every hour of the year it stands in for, with the
+# share of the slice's energy in each of those hours. Multi-day seasons have 24 x days tods and their
+# num_days cover that many days per repeat, so each slice stands in for one hour per repeat of its season
+def _map_hours(conn: sqlite3.Connection) -> int:
+
+    conn.execute("""CREATE TEMP TABLE hour_map(
+                period INTEGER, season TEXT, tod TEXT, hour INTEGER, share REAL,
+                PRIMARY KEY (period, season, tod, hour)) WITHOUT ROWID""")
+
+    tods = np.array([row[0] for row in conn.execute("SELECT tod FROM src.TimeOfDay ORDER BY sequence").fetchall()])
+    days_per_season = len(tods) / 24
+
+    n_hours = 0
+    periods = [row[0] for row in conn.execute("SELECT DISTINCT period FROM src.TimeSeasonSequential ORDER BY period").fetchall()]
+    for period in periods:
+        sequence = conn.execute("SELECT season, num_days FROM src.TimeSeasonSequential WHERE period = ? ORDER BY sequence", (period,)).fetchall()
+        seasons = np.array([season for season, _ in sequence])
+        repeats = np.rint(np.array([num_days for _, num_days in sequence]) / days_per_season).astype(int)
+
+        # Season then tod of every hour in chronological order
+        season_idx = np.repeat(np.arange(len(seasons)), repeats * len(tods))
+        tod_idx = np.tile(np.arange(len(tods)), repeats.sum())
+        hours = np.arange(1, len(season_idx) + 1)
+
+        # A season may appear more than once in the sequence so count its repeats over the whole period
+        season_repeats = {season: 0 for season in seasons}
+        for season, n in zip(seasons, repeats): season_repeats[season] += n
+        shares = 1.0 / np.array([season_repeats[season] for season in seasons])
+
+        conn.executemany(
+            "INSERT INTO temp.hour_map VALUES(?, ?, ?, ?, ?)",
+            zip([period] * len(hours), seasons[season_idx].tolist(), tods[tod_idx].tolist(), hours.tolist(), shares[season_idx].tolist()),
+        )
+        n_hours = max(n_hours, len(hours))
+
+    return n_hours
+
+
+
+# Expands each region and tech in one INSERT ... SELECT, committing between them.
+# Returns the number of rows written and the total value written for each region and tech
+def _write_sqlite(conn: sqlite3.Connection, select: str, groups: list, cols: list, value_col: str, out_table: str) -> tuple[int, dict]:
+
+    conn.execute(f"DROP TABLE IF EXISTS main.{out_table}")
+    conn.execute(f"CREATE TABLE main.{out_table}({', '.join(f'{col} {dtype}' for col, dtype in cols)})")
+
+    n_rows = 0
+    for region, tech in groups:
+        n_rows += conn.execute(f"INSERT INTO main.{out_table} {select}", (region, tech)).rowcount
+        conn.commit()
+
+    totals = conn.execute(f"SELECT region, tech, SUM({value_col}) FROM main.{out_table} GROUP BY region, tech").fetchall()
+    return n_rows, {(region, tech): total for region, tech, total in totals}
+
+
+
+# Streams each region and tech in chunks of at most chunk_rows, each written as a Parquet row group.
+# Returns the number of rows written and the total value written for each region and tech
+def _write_parquet(conn: sqlite3.Connection, select: str, groups: list, cols: list, value_idx: int, out_file: str, chunk_rows: int) -> tuple[int, dict]:
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    types = {'INTEGER': pa.int64(), 'REAL': pa.float64()}
+    schema = pa.schema([(col, types.get(dtype, pa.string())) for col, dtype in cols])
+
+    n_rows = 0
+    totals = dict()
+    with pq.ParquetWriter(out_file, schema) as writer:
+        for region, tech in groups:
+            curs = conn.execute(select, (region, tech))
+            while rows := curs.fetchmany(chunk_rows):
+                arrays = [pa.array(col, type=schema.field(i).type) for i, col in enumerate(zip(*rows))]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                totals[(region, tech)] = totals.get((region, tech), 0.0) + (pc.sum(arrays[value_idx]).as_py() or 0.0)
+                n_rows += len(rows)
+
+    return n_rows, totals
+
+
+
+# Checks that the hourly values written for each region and tech sum to those of the solved table
+def _check_totals(conn: sqlite3.Connection, table: str, value_col: str, totals: dict):
+
+    solved = conn.execute(f"SELECT region, tech, SUM({value_col}) FROM src.{table} GROUP BY region, tech").fetchall()
+
+    mismatched = []
+    for region, tech, total in solved:
+        expanded = totals.get((region, tech)) or 0.0
+        if not np.isclose(expanded, total or 0.0, rtol=1e-9, atol=1e-9): mismatched.append((region, tech, total, expanded))
+
+    if not mismatched: return
+
+    print(f"    WARNING {table} hourly totals differ from the solved table for {len(mismatched)} region, tech pairs:")
+    for region, tech, total, expanded in mismatched:
+        print(f"        {region}, {tech}: {total} solved, {expanded} expanded")
+
+
+
+if __name__ == "__main__":
+
+    # e.g. python output_expansion.py solved.sqlite [out_path] [--parquet]
+    parquet = '--parquet' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--parquet']
+    expand(args[0], args[1] if len(args) > 1 else None, parquet)
@@ -29,11 +29,50 @@ Usage:
 from pca_utils import get_principal_components
 pcs_df = get_principal_components(df, config)
 """
-from typing import Dict, List
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
 import numpy as np
 import pandas as pd
 
 
+@dataclass
+class PCAModel:
+    """A fitted PCA basis for one group, enough to score new data without refitting.
+
+    Attributes
+    ----------
+    name : str
+        Group name, the prefix of the score columns.
+    columns : List[str]
+        Series the basis was fitted on, in order.
+    means, stds : np.ndarray
+        Per-series mean and standard deviation used to standardise, shape (n_features,).
+    loadings : np.ndarray
+        Component loadings, shape (k, n_features).
+    explained_variance : np.ndarray
+        Variance of each component's scores, shape (k,).
+    explained_variance_ratio : np.ndarray
+        Fraction of the group's total standardised variance each component explains, shape (k,).
+    spectrum : np.ndarray
+        Explained variance ratio of every component the decomposition computed, kept or not.
+        All components unless a count was fixed and the decomposition truncated.
+    """
+    name: str
+    columns: List[str]
+    means: np.ndarray
+    stds: np.ndarray
+    loadings: np.ndarray
+    explained_variance: np.ndarray
+    explained_variance_ratio: np.ndarray
+    spectrum: np.ndarray
+
+    @property
+    def score_columns(self) -> List[str]:
+        return [f"{self.name}_pc{i+1}" for i in range(len(self.loadings))]
+
+
 def standardise(X: pd.DataFrame) -> tuple[pd.DataFrame, pd.Series, pd.Series]:
     """Center (and optionally scale) the columns of X.
 
@@ -48,21 +87,76 @@ def standardise(X: pd.DataFrame) -> tuple[pd.DataFrame, pd.Series, pd.Series]:
     return Xc / std_replaced
 
 
-def _pca_scores_via_svd(X: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+def _choose_svd_method(shape: tuple[int, int], k: int) -> str:
+    """Pick an SVD strategy for an (n_samples, n_features) matrix keeping k components.
+
+    - "covariance" for tall-skinny matrices: eigen-decompose the small
+      (n_features, n_features) matrix X^T X instead of factorising X itself.
+    - "randomized" when only a small fraction of a large spectrum is kept.
+    - "full" otherwise.
+    """
+    n, m = shape
+    if m <= 1000 and n >= 4 * m:
+        return "covariance"
+    if min(n, m) > 1000 and k <= min(n, m) // 10:
+        return "randomized"
+    return "full"
+
+
+def _svd(X: np.ndarray, k: int, method: str = "auto") -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Leading k singular triplets of X as (U, S, Vt) with shapes (n, k), (k,), (k, m).
+
+    method is one of "auto", "full", "randomized" or "covariance". Results agree
+    between methods up to the sign of each component, which the caller fixes.
+    """
+    if method == "auto":
+        method = _choose_svd_method(X.shape, k)
+
+    if method == "full":
+        U, S, Vt = np.linalg.svd(X, full_matrices=False)
+        return U[:, :k], S[:k], Vt[:k, :]
+
+    if method == "covariance":
+        # Eigenvalues of X^T X are the squared singular values, eigenvectors the right singular vectors
+        evals, evecs = np.linalg.eigh(X.T @ X)
+        order = np.argsort(evals)[::-1][:k]
+        S = np.sqrt(np.clip(evals[order], 0, None))
+        Vt = evecs[:, order].T
+        U = (X @ Vt.T) / np.where(S > 0, S, 1.0)
+        return U, S, Vt
+
+    if method == "randomized":
+        # Halko et al. range finder with a fixed seed so results are repeatable
+        rng = np.random.default_rng(0)
+        n_random = min(k + 10, min(X.shape))
+        Q = X @ rng.standard_normal((X.shape[1], n_random))
+        for _ in range(4):  # power iterations sharpen a slowly decaying spectrum
+            Q, _r = np.linalg.qr(Q)
+            Q, _r = np.linalg.qr(X.T @ Q)
+            Q = X @ Q
+        Q, _r = np.linalg.qr(Q)
+        Ub, S, Vt = np.linalg.svd(Q.T @ X, full_matrices=False)
+        return (Q @ Ub)[:, :k], S[:k], Vt[:k, :]
+
+    raise ValueError(f"Unknown SVD method '{method}'. Use 'auto', 'full', 'randomized' or 'covariance'.")
+
+
+def _pca_scores_via_svd(X: np.ndarray, k: int, method: str = "auto") -> tuple[np.ndarray, np.ndarray]:
     """Compute first k principal component scores and loadings via SVD.
 
     X should already be centered (and scaled if desired).
     Returns (scores, loadings) where:
       - scores shape: (n_samples, k)  = U[:, :k] * S[:k]
       - loadings shape: (k, n_features) = Vt[:k, :]
+    The decomposition strategy is chosen by `method` (see `_svd`), by shape if "auto".
     Also flips signs to make each component's loadings sum positive (deterministic sign).
     """
-    U, S, Vt = np.linalg.svd(X, full_matrices=False)
-    k = max(0, min(k, U.shape[1]))
+    k = max(0, min(k, *X.shape))
     if k == 0:
         return np.zeros((X.shape[0], 0)), np.zeros((0, X.shape[1]))
-    scores = U[:, :k] * S[:k]
-    loadings = Vt[:k, :]
+    U, S, Vt = _svd(X, k, method)
+    scores = U * S
+    loadings = Vt.copy()
     # Deterministic sign: flip so sum of loadings for each component is >= 0
     for i in range(k):
         if np.nansum(loadings[i]) < 0:
@@ -71,7 +165,76 @@ def _pca_scores_via_svd(X: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
     return scores, loadings
 
 
-def get_principal_components(df: pd.DataFrame, groups: list[Dict]) -> pd.DataFrame:
+def _n_components(spectrum: np.ndarray, k: int, target: Optional[float]) -> int:
+    """Number of leading components to keep from the explained variance ratios in `spectrum`.
+
+    Without a target, all of them. With one, the fewest whose cumulative ratio reaches it,
+    capped at k if k > 0.
+    """
+    if target is None:
+        return len(spectrum)
+    n = min(int(np.searchsorted(np.cumsum(spectrum), target - 1e-12)) + 1, len(spectrum))
+    return min(n, k) if k > 0 else n
+
+
+def _group_target(name: str, g: Dict) -> Optional[float]:
+    target = g.get('variance_target')
+    if target is not None and not 0 < float(target) <= 1:
+        raise ValueError(f"Group '{name}': variance_target must be in (0, 1], got {target}.")
+    return None if target is None else float(target)
+
+
+def _group_frame(df: pd.DataFrame, name: str, cols: List[str]) -> pd.DataFrame:
+    """Validate a group's columns in `df` and return them linearly interpolated."""
+    # Validate columns are strings and exist
+    if not all(isinstance(c, str) for c in cols):
+        raise ValueError(f"Group '{name}': all 'columns' must be string names.")
+    missing = [c for c in cols if c not in df.columns]
+    if missing:
+        raise ValueError(f"Group '{name}': columns not found in df: {missing}")
+
+    # Ensure all are numeric
+    non_numeric = [c for c in cols if not pd.api.types.is_numeric_dtype(df[c])]
+    if non_numeric:
+        raise ValueError(f"Group '{name}': non-numeric columns: {non_numeric}")
+
+    X = df[cols].interpolate('linear')
+
+    # Check for NaNs
+    if X.isna().any().any():
+        na_cols = [c for c in cols if X[c].isna().any()]
+        raise ValueError(
+            f"Group '{name}': NaNs present in columns {na_cols}. "
+            "Please drop or impute NaNs before computing principal components."
+        )
+    return X
+
+
+def _decompose(
+    X: np.ndarray, k: int, target: Optional[float], method: str
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """PCA of centred X keeping k components, or as many as `target` needs.
+
+    Returns (scores, loadings, explained_variance, spectrum) where the first three cover
+    the kept components and spectrum is the explained variance ratio of every component
+    computed. With a target every component is computed in the one decomposition.
+    """
+    k_fit = X.shape[1] if target is not None else int(np.clip(k, 0, X.shape[1]))
+    scores, loadings = _pca_scores_via_svd(X, k_fit, method)
+
+    # Squared singular values over the total sum of squares
+    variance = (scores ** 2).sum(axis=0) / len(X)
+    spectrum = variance / max((X ** 2).sum() / len(X), np.finfo(float).tiny)
+    k_eff = _n_components(spectrum, k, target)
+    return scores[:, :k_eff], loadings[:k_eff], variance[:k_eff], spectrum
+
+
+def get_principal_components(
+    df: pd.DataFrame,
+    groups: list[Dict],
+    models: Optional[List[PCAModel]] = None,
+    n_jobs: Optional[int] = None,
+) -> pd.DataFrame:
     """Compute principal components for groups of time series in `df`.
 
     Parameters
@@ -85,8 +248,18 @@ def get_principal_components(df: pd.DataFrame, groups: list[Dict]) -> pd.DataFra
                                   a default name like "group0" is used.
           - columns (List[str]): Column names in `df` (strings only).
           - n_components (int): Number of principal components to return for this group.
+          - variance_target (float, optional): Instead keep the fewest components explaining
+                                               at least this fraction of the group's variance,
+                                               e.g. 0.95. n_components, if also given, caps them.
           - scale (bool, optional): If True (default), z-score each series within the group
                                     prior to PCA. If False, only mean-centers.
+          - svd (str, optional): "full", "randomized" or "covariance" decomposition, or
+                                 "auto" (default) to choose by the shape of the group.
+    models : List[PCAModel], optional
+        If given, the fitted model of each group is appended to it, e.g. for `save_models`.
+    n_jobs : int, optional
+        Number of groups fitted concurrently in a thread pool. Defaults to one per group
+        up to the number of CPUs; 1 fits them serially. Output is in config order either way.
 
     Returns
     -------
@@ -99,57 +272,400 @@ def get_principal_components(df: pd.DataFrame, groups: list[Dict]) -> pd.DataFra
     - No imputation is performed. If NaNs exist in a group's columns, a ValueError is raised.
     - All specified columns must exist and be numeric; otherwise a ValueError is raised.
     - If `n_components` exceeds the number of available numeric columns, it is clipped.
+    - A variance target takes every component from the same decomposition, so choosing
+      k costs no extra SVD and the model's spectrum covers every component for tuning.
+    """
+
+    if not isinstance(groups, list) or len(groups) == 0:
+        raise ValueError("config['groups'] must be a non-empty list")
+
+    names = [g.get('name', f'group{gi}') for gi, g in enumerate(groups)]
+    if n_jobs is None:
+        n_jobs = min(len(groups), os.cpu_count() or 1)
+
+    # Groups are independent and NumPy releases the GIL in the decompositions
+    if n_jobs <= 1:
+        fitted = [_named_result(name, lambda g=g: _fit_group(df, name, g)) for name, g in zip(names, groups)]
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_fit_group, df, name, g) for name, g in zip(names, groups)]
+            fitted = [_named_result(name, future.result) for name, future in zip(names, futures)]
+
+    # Results in config order regardless of which group finished first
+    out_parts: List[pd.DataFrame] = []
+    for part in fitted:
+        if part is None:
+            continue  # nothing to do
+        pcs_df, model = part
+        out_parts.append(pcs_df)
+        if models is not None:
+            models.append(model)
+
+    if not out_parts:
+        # Return empty frame with same index if nothing computed
+        print(f"Got no PCs for {names}")
+        return pd.DataFrame(index=df.index)
+
+    return pd.concat(out_parts, axis=1)
+
+
+def _named_result(name: str, result: Callable):
+    """Return `result()`, re-raising any failure other than our own ValueErrors with the group's name."""
+    try:
+        return result()
+    except np.linalg.LinAlgError as e:
+        # A subclass of ValueError but raised by NumPy, so it does not name the group
+        raise RuntimeError(f"Group '{name}': principal components failed: {e}") from e
+    except ValueError:
+        raise  # already names the group
+    except Exception as e:
+        raise RuntimeError(f"Group '{name}': principal components failed: {e}") from e
+
+
+def _fit_group(df: pd.DataFrame, name: str, g: Dict) -> Optional[tuple[pd.DataFrame, PCAModel]]:
+    """Scores and fitted model of one group for `get_principal_components`, None if it has no components."""
+    cols = g.get('columns', [])
+    k = int(g.get('n_components', 0))
+    target = _group_target(name, g)
+    if k <= 0 and target is None:
+        return None
+
+    X = _group_frame(df, name, cols).to_numpy(dtype=float)
+
+    # Standardise as in standardise, keeping the means and stds for the model
+    means = X.mean(axis=0)
+    stds = X.std(axis=0)
+    stds[stds == 0.0] = 1.0  # avoid division by zero
+    X_std = (X - means) / stds
+
+    # PCA via SVD
+    scores, loadings, variance, spectrum = _decompose(X_std, k, target, g.get('svd', 'auto'))
+    k_eff = len(loadings)
+
+    model = PCAModel(
+        name=name,
+        columns=list(cols),
+        means=means,
+        stds=stds,
+        loadings=loadings,
+        explained_variance=variance[:k_eff],
+        explained_variance_ratio=spectrum[:k_eff],
+        spectrum=spectrum,
+    )
+
+    # Create output columns
+    col_names = [f"{name}_pc{i+1}" for i in range(k_eff)]
+    return pd.DataFrame(scores, index=df.index, columns=col_names), model
+
+
+def get_period_profile_components(
+    df: pd.DataFrame, groups: list[Dict], hours_per_period: int
+) -> pd.DataFrame:
+    """Compute principal components of whole-period profiles rather than of single hours.
+
+    Each group's series are standardised as in `get_principal_components`, then every
+    period's profile of all its series over all its hours becomes one row of a
+    (n_periods, hours_per_period * n_columns) matrix. That matrix is centred and
+    decomposed, so each period is summarised by a few component scores, e.g. 10-20
+    features per day rather than 24 for every hourly component.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Hourly time series, as for `get_principal_components`.
+    groups : list[Dict]
+        Group configs as for `get_principal_components`. n_components or variance_target
+        count profile components here.
+    hours_per_period : int
+        Length of a period. An incomplete last period is completed with the first hours
+        of the series, as tsam does.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per period with columns "{group_name}_pc{1..k}".
+
+    Notes
+    -----
+    Models are not collected as profile scores cannot be projected hour by hour.
     """
 
     if not isinstance(groups, list) or len(groups) == 0:
         raise ValueError("config['groups'] must be a non-empty list")
 
+    n_periods = -(-len(df) // hours_per_period)
     out_parts: List[pd.DataFrame] = []
 
     for gi, g in enumerate(groups):
         name = g.get('name', f'group{gi}')
         cols = g.get('columns', [])
         k = int(g.get('n_components', 0))
-        if k <= 0:
+        target = _group_target(name, g)
+        if k <= 0 and target is None:
             continue  # nothing to do
 
-        # Validate columns are strings and exist
-        if not all(isinstance(c, str) for c in cols):
-            raise ValueError(f"Group '{name}': all 'columns' must be string names.")
-        missing = [c for c in cols if c not in df.columns]
-        if missing:
-            raise ValueError(f"Group '{name}': columns not found in df: {missing}")
+        Z = standardise(_group_frame(df, name, cols)).to_numpy()
+        Z = np.concatenate([Z, Z[:n_periods * hours_per_period - len(Z)]])
+
+        # One row per period of its hours x series, centred on the mean profile
+        profiles = Z.reshape(n_periods, hours_per_period * len(cols))
+        profiles = profiles - profiles.mean(axis=0)
 
-        # Ensure all are numeric
-        non_numeric = [c for c in cols if not pd.api.types.is_numeric_dtype(df[c])]
+        scores, loadings, variance, spectrum = _decompose(profiles, k, target, g.get('svd', 'auto'))
+        col_names = [f"{name}_pc{i+1}" for i in range(len(loadings))]
+        out_parts.append(pd.DataFrame(scores, columns=col_names))
+
+    if not out_parts:
+        return pd.DataFrame(index=range(n_periods))
+
+    return pd.concat(out_parts, axis=1)
+
+
+def _interpolated_chunks(chunks: Iterable[pd.DataFrame], name: str, cols: List[str]) -> Iterable[pd.DataFrame]:
+    """Linearly interpolate a stream of chunks as if they were one frame.
+
+    Rows from the last complete row of a chunk onwards are held back and prepended
+    to the next chunk, so gaps spanning a chunk boundary interpolate between the
+    values either side, the same as `interpolate('linear')` on the whole series.
+    Each chunk's columns are validated as in `_group_frame`.
+    """
+    carry = None
+    for chunk in chunks:
+        missing = [c for c in cols if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"Group '{name}': columns not found in chunk: {missing}")
+        non_numeric = [c for c in cols if not pd.api.types.is_numeric_dtype(chunk[c])]
         if non_numeric:
             raise ValueError(f"Group '{name}': non-numeric columns: {non_numeric}")
 
-        X = df[cols].copy().interpolate('linear')
+        X = chunk[cols] if carry is None else pd.concat([carry, chunk[cols]])
+        complete = np.flatnonzero(X.notna().all(axis=1).to_numpy())
+        if len(complete) == 0:
+            carry = X
+            continue
+        last = complete[-1]
+        if last > 0:
+            yield X.interpolate('linear').iloc[:last]
+        carry = X.iloc[last:]
+    if carry is not None and len(carry) > 0:
+        yield carry.interpolate('linear')
 
-        # Check for NaNs
-        if X.isna().any().any():
-            na_cols = [c for c in cols if X[c].isna().any()]
-            raise ValueError(
-                f"Group '{name}': NaNs present in columns {na_cols}. "
-                "Please drop or impute NaNs before calling get_principal_components."
-            )
 
-        # Standardise (center and optionally scale)
-        X_std = standardise(X)
+def get_principal_components_streaming(
+    read_chunks: Callable[[List[str]], Iterable[pd.DataFrame]],
+    groups: list[Dict],
+    models: Optional[List[PCAModel]] = None,
+) -> pd.DataFrame:
+    """Compute principal components group by group from chunks of rows, without holding any group in memory.
+
+    Same output as `get_principal_components`, in two passes over the data per group:
+      1. Accumulate column means and the centred cross-product matrix chunk by chunk,
+         merging chunk statistics pairwise (Chan et al.) so large means do not cancel.
+         The leading eigenvectors of the resulting correlation matrix are the loadings.
+      2. Standardise and project each chunk onto those loadings.
+
+    Parameters
+    ----------
+    read_chunks : Callable[[List[str]], Iterable[pd.DataFrame]]
+        Called with a group's columns, returns an iterator over consecutive chunks of
+        rows holding at least those columns. Called twice per group.
+    groups : list[Dict]
+        Group configs as for `get_principal_components`. The `svd` key does not apply,
+        as the decomposition is always of the (n_features, n_features) correlation matrix.
+    models : List[PCAModel], optional
+        If given, the fitted model of each group is appended to it.
+
+    Returns
+    -------
+    pd.DataFrame
+        Principal component scores with a RangeIndex over all rows, columns "{group_name}_pc{1..k}".
 
-        # PCA via SVD
-        k_eff = int(np.clip(k, 0, X_std.shape[1]))
-        scores, loadings = _pca_scores_via_svd(X_std.to_numpy(), k_eff)
+    Notes
+    -----
+    Memory per group is one chunk plus an (n_features, n_features) matrix, so a
+    30-year hourly group of 200 series needs a few MB beyond the chunk itself.
+    """
+
+    if not isinstance(groups, list) or len(groups) == 0:
+        raise ValueError("config['groups'] must be a non-empty list")
+
+    out_parts: List[pd.DataFrame] = []
+
+    for gi, g in enumerate(groups):
+        name = g.get('name', f'group{gi}')
+        cols = g.get('columns', [])
+        k = int(g.get('n_components', 0))
+        target = _group_target(name, g)
+        if k <= 0 and target is None:
+            continue  # nothing to do
+
+        if not all(isinstance(c, str) for c in cols):
+            raise ValueError(f"Group '{name}': all 'columns' must be string names.")
+
+        # First pass: running means and centred cross products
+        n = 0
+        mu = np.zeros(len(cols))
+        m2 = np.zeros((len(cols), len(cols)))
+        for X in _interpolated_chunks(read_chunks(cols), name, cols):
+            if X.isna().any().any():
+                na_cols = [c for c in cols if X[c].isna().any()]
+                raise ValueError(
+                    f"Group '{name}': NaNs present in columns {na_cols}. "
+                    "Please drop or impute NaNs before calling get_principal_components_streaming."
+                )
+            Xa = X.to_numpy(dtype=float)
+            n_c = len(Xa)
+            mu_c = Xa.mean(axis=0)
+            Xc = Xa - mu_c
+            delta = mu_c - mu
+            m2 += Xc.T @ Xc + np.outer(delta, delta) * (n * n_c / (n + n_c))
+            mu += delta * (n_c / (n + n_c))
+            n += n_c
+
+        if n == 0:
+            raise ValueError(f"Group '{name}': no rows to compute principal components from.")
+
+        std = np.sqrt(np.diag(m2) / n)
+        std[std == 0.0] = 1.0  # avoid division by zero, as in standardise
+
+        # Eigenvalues of the standardised cross products are the squared singular values
+        evals, evecs = np.linalg.eigh(m2 / np.outer(std, std))
+        evals = np.clip(evals[::-1], 0, None)
+        evecs = evecs[:, ::-1]
+        spectrum = evals / max(evals.sum(), np.finfo(float).tiny)
+        k_eff = _n_components(spectrum, k, target) if target is not None else int(np.clip(k, 0, len(cols)))
+        loadings = evecs[:, :k_eff].T
+        # Deterministic sign: flip so sum of loadings for each component is >= 0
+        loadings *= np.where(loadings.sum(axis=1) < 0, -1.0, 1.0)[:, None]
+
+        if models is not None:
+            models.append(PCAModel(
+                name=name,
+                columns=list(cols),
+                means=mu,
+                stds=std,
+                loadings=loadings,
+                explained_variance=evals[:k_eff] / n,
+                explained_variance_ratio=spectrum[:k_eff],
+                spectrum=spectrum,
+            ))
+
+        # Second pass: project each standardised chunk
+        scores = [
+            ((X.to_numpy(dtype=float) - mu) / std) @ loadings.T
+            for X in _interpolated_chunks(read_chunks(cols), name, cols)
+        ]
 
-        # Create output columns
         col_names = [f"{name}_pc{i+1}" for i in range(k_eff)]
-        pcs_df = pd.DataFrame(scores, index=df.index, columns=col_names)
-        out_parts.append(pcs_df)
+        out_parts.append(pd.DataFrame(np.vstack(scores), columns=col_names))
+
+    if not out_parts:
+        return pd.DataFrame()
+
+    return pd.concat(out_parts, axis=1)
+
+
+def project(df: pd.DataFrame, models: List[PCAModel]) -> pd.DataFrame:
+    """Score time series in `df` against previously fitted PCA models, without refitting.
+
+    Each model's columns are interpolated and standardised with the model's own means
+    and stds, then projected onto its loadings, so scores stay comparable with those
+    of the run that fitted it even when `df` covers different or additional years.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Time series holding at least every model's columns.
+    models : List[PCAModel]
+        Fitted models, e.g. from `load_models`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Principal component scores with the same index as `df`, columns "{group_name}_pc{1..k}".
+    """
+    out_parts: List[pd.DataFrame] = []
+
+    for model in models:
+        missing = [c for c in model.columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"Group '{model.name}': columns not found in df: {missing}")
+
+        X = df[model.columns].interpolate('linear')
+        if X.isna().any().any():
+            na_cols = [c for c in model.columns if X[c].isna().any()]
+            raise ValueError(f"Group '{model.name}': NaNs present in columns {na_cols}.")
+
+        scores = ((X.to_numpy(dtype=float) - model.means) / model.stds) @ model.loadings.T
+        out_parts.append(pd.DataFrame(scores, index=df.index, columns=model.score_columns))
 
     if not out_parts:
-        # Return empty frame with same index if nothing computed
-        print(f"Got no PCs for {name}")
         return pd.DataFrame(index=df.index)
 
-    return pd.concat(out_parts, axis=1)
\ No newline at end of file
+    return pd.concat(out_parts, axis=1)
+
+
+def save_models(models: List[PCAModel], model_dir: str) -> None:
+    """Write each model to `model_dir` as two csv files.
+
+    "{name}.csv" has one row per series with its mean, std and loading on each kept component,
+    "{name}_variance.csv" one row per component in the spectrum with its explained variance
+    ratio, the cumulative ratio and whether it was kept, for choosing n_components or a target.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    for model in models:
+        df_basis = pd.DataFrame(model.loadings.T, index=model.columns, columns=model.score_columns)
+        df_basis.insert(0, 'std', model.stds)
+        df_basis.insert(0, 'mean', model.means)
+        df_basis.index.name = 'column'
+        df_basis.to_csv(os.path.join(model_dir, f"{model.name}.csv"))
+
+        n_kept = len(model.loadings)
+        df_variance = pd.DataFrame(
+            {
+                'explained_variance': np.r_[model.explained_variance, np.full(len(model.spectrum) - n_kept, np.nan)],
+                'explained_variance_ratio': model.spectrum,
+                'cumulative_ratio': np.cumsum(model.spectrum),
+                'kept': np.arange(len(model.spectrum)) < n_kept,
+            },
+            index=pd.Index([f"{model.name}_pc{i+1}" for i in range(len(model.spectrum))], name='component'),
+        )
+        df_variance.to_csv(os.path.join(model_dir, f"{model.name}_variance.csv"))
+
+
+def load_models(model_dir: str, groups: list[Dict]) -> List[PCAModel]:
+    """Read the models saved by `save_models` for each configured group.
+
+    Raises a ValueError if a group has no saved model or its columns differ from
+    those the saved model was fitted on, as its scores would not be comparable.
+    """
+    models: List[PCAModel] = []
+
+    for gi, g in enumerate(groups):
+        name = g.get('name', f'group{gi}')
+        if int(g.get('n_components', 0)) <= 0 and g.get('variance_target') is None:
+            continue
+
+        basis_file = os.path.join(model_dir, f"{name}.csv")
+        variance_file = os.path.join(model_dir, f"{name}_variance.csv")
+        if not os.path.exists(basis_file) or not os.path.exists(variance_file):
+            raise ValueError(f"Group '{name}': no saved PCA model in {model_dir}. Fit one first.")
+
+        df_basis = pd.read_csv(basis_file, index_col=0)
+        df_variance = pd.read_csv(variance_file, index_col=0)
+        df_kept = df_variance[df_variance['kept']]
+        if list(df_basis.index) != list(g.get('columns', [])):
+            raise ValueError(f"Group '{name}': columns differ from those of the saved PCA model in {basis_file}.")
+
+        models.append(PCAModel(
+            name=name,
+            columns=list(df_basis.index),
+            means=df_basis['mean'].to_numpy(),
+            stds=df_basis['std'].to_numpy(),
+            loadings=df_basis[list(df_kept.index)].to_numpy().T,
+            explained_variance=df_kept['explained_variance'].to_numpy(),
+            explained_variance_ratio=df_kept['explained_variance_ratio'].to_numpy(),
+            spectrum=df_variance['explained_variance_ratio'].to_numpy(),
+        ))
+
+    return models
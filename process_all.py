@@ -7,14 +7,16 @@ import database_processing_v3
 import database_processing_v3_1
 import clustering
 import utils
+import sys
 from matplotlib import pyplot as pp
 
-def run():
+# force rebuilds databases even if their inputs have not changed since the last run
+def run(force: bool = False):
 
-    clustering.run() # cluster periods
-    database_processing.process_all() # process Temoa 2 databases
-    database_processing_v3.process_all() # process Temoa 3 databases
-    database_processing_v3_1.process_all() # process Temoa 3.1 databases
+    result = clustering.run() # cluster periods, handed straight to database processing
+    database_processing.process_all(force, result) # process Temoa 2 databases
+    database_processing_v3.process_all(force, result) # process Temoa 3 databases
+    database_processing_v3_1.process_all(force, result) # process Temoa 3.1 databases
 
     print("All processing completed.")
 
@@ -26,4 +28,4 @@ def run():
 
 if __name__ == "__main__":
 
-    run()
\ No newline at end of file
+    run(force='--force' in sys.argv)
\ No newline at end of file
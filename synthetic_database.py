@@ -0,0 +1,113 @@
+"""
+Builds synthetic CANOE v3.1 databases of configurable size from canoe_schema_v3_1.sql
+so database processing can be benchmarked without real input databases
+"""
+
+import sqlite3
+import os
+import sys
+import numpy as np
+import utils
+
+this_dir = os.path.realpath(os.path.dirname(__file__)) + "/"
+schema = this_dir + "canoe_schema_v3_1.sql"
+
+seasons = [utils.stringify_day(day + 1) for day in range(365)]
+tods = [utils.stringify_hour(hour + 1) for hour in range(24)]
+
+
+# Writes a valid v3.1 database with 365 seasons of 24 tods. Generating techs have an hourly
+# capacity factor in every region and period, and each demand has an hourly DSD
+def build(
+        out_file: str,
+        regions: int = 1,
+        techs: int = 10,
+        demands: int = 2,
+        periods: int = 3,
+        seed: int = 0,
+    ):
+
+    rng = np.random.default_rng(seed)
+    if os.path.exists(out_file): os.remove(out_file)
+
+    conn = sqlite3.connect(out_file)
+    curs = conn.cursor()
+    curs.executescript(open(schema, 'r').read())
+
+    region_names = [f"R{r+1:02d}" for r in range(regions)]
+    tech_names = [f"GEN{t+1:03d}" for t in range(techs)]
+    demand_names = [f"DEM{d+1:02d}" for d in range(demands)]
+    future = [2025 + 5*p for p in range(periods)]
+
+    # Index tables
+    curs.execute("INSERT INTO TimePeriod(sequence, period, flag) VALUES(0, 2020, 'e')")
+
+    # Time tables are written for every configured model year, so these must all be periods
+    all_periods = sorted(set(future) | set(utils.config['model_years']))
+    curs.executemany("INSERT INTO TimePeriod(sequence, period, flag) VALUES(?, ?, 'f')", [(i+1, p) for i, p in enumerate(all_periods + [all_periods[-1] + 5])])
+
+    curs.executemany("REPLACE INTO TimeOfDay(sequence, tod) VALUES(?, ?)", [(h+1, tod) for h, tod in enumerate(tods)])
+    curs.executemany("INSERT INTO SeasonLabel(season) VALUES(?)", [(s,) for s in seasons])
+    curs.executemany("INSERT INTO Region(region) VALUES(?)", [(r,) for r in region_names])
+
+    curs.execute("INSERT INTO Commodity(name, flag) VALUES('ethos', 's')")
+    curs.execute("INSERT INTO Commodity(name, flag) VALUES('ELC', 'p')")
+    curs.executemany("INSERT INTO Commodity(name, flag) VALUES(?, 'd')", [(d,) for d in demand_names])
+
+    techs_flags = [(t, 'p') for t in tech_names] + [(f"{d}_SUPPLY", 'p') for d in demand_names]
+    curs.executemany(
+        """INSERT INTO Technology(tech, flag, unlim_cap, annual, reserve, curtail, retire, flex, exchange, seas_stor)
+        VALUES(?, ?, 0, 0, 0, 0, 0, 0, 0, 0)""",
+        techs_flags,
+    )
+
+    # Direct copy tables. Small next to the hourly tables but enough to exercise the copy
+    for region in region_names:
+        for tech in tech_names:
+            curs.execute("INSERT INTO ExistingCapacity(region, tech, vintage, capacity) VALUES(?, ?, 2020, ?)", (region, tech, rng.uniform(1, 10)))
+            curs.execute("INSERT INTO LifetimeTech(region, tech, lifetime) VALUES(?, ?, 30)", (region, tech))
+            for vintage in [2020] + future:
+                curs.execute("INSERT INTO Efficiency(region, input_comm, tech, vintage, output_comm, efficiency) VALUES(?, 'ethos', ?, ?, 'ELC', 1)", (region, tech, vintage))
+            for vintage in future:
+                curs.execute("INSERT INTO CostInvest(region, tech, vintage, cost) VALUES(?, ?, ?, ?)", (region, tech, vintage, rng.uniform(500, 3000)))
+                for period in future:
+                    if period < vintage: continue
+                    curs.execute("INSERT INTO CostVariable(region, period, tech, vintage, cost) VALUES(?, ?, ?, ?, ?)", (region, period, tech, vintage, rng.uniform(0, 50)))
+
+        for demand in demand_names:
+            for vintage in [2020] + future:
+                curs.execute("INSERT INTO Efficiency(region, input_comm, tech, vintage, output_comm, efficiency) VALUES(?, 'ELC', ?, ?, ?, 1)", (region, f"{demand}_SUPPLY", vintage, demand))
+            for period in future:
+                curs.execute("INSERT INTO Demand(region, period, commodity, demand) VALUES(?, ?, ?, ?)", (region, period, demand, rng.uniform(100, 1000)))
+
+    # Hourly tables, a daily and seasonal shape plus noise
+    hour = np.arange(8760)
+    shape = 1 + 0.3*np.sin(2*np.pi*hour/24) + 0.2*np.cos(2*np.pi*hour/8760)
+    keys = [(season, tod) for season in seasons for tod in tods]
+
+    for region in region_names:
+        for period in future:
+            for tech in tech_names:
+                factor = np.clip(shape/2 + rng.normal(0, 0.15, 8760), 0, 1)
+                curs.executemany(
+                    "INSERT INTO CapacityFactorTech(region, period, season, tod, tech, factor) VALUES(?, ?, ?, ?, ?, ?)",
+                    ((region, period, s, t, tech, float(f)) for (s, t), f in zip(keys, factor)),
+                )
+            for demand in demand_names:
+                dsd = np.clip(shape + rng.normal(0, 0.1, 8760), 0.01, None)
+                dsd /= dsd.sum()
+                curs.executemany(
+                    "INSERT INTO DemandSpecificDistribution(region, period, season, tod, demand_name, dsd) VALUES(?, ?, ?, ?, ?, ?)",
+                    ((region, period, s, t, demand, float(d)) for (s, t), d in zip(keys, dsd)),
+                )
+
+    conn.commit()
+    conn.close()
+
+
+
+if __name__ == "__main__":
+
+    # e.g. python synthetic_database.py input_sqlite/synthetic.sqlite regions=2 techs=20
+    kwargs = {key: int(value) for key, value in (arg.split('=') for arg in sys.argv[2:])}
+    build(sys.argv[1], **kwargs)
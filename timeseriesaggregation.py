@@ -80,6 +80,88 @@ def unstackToPeriods(timeSeries, timeStepsPerPeriod):
     return unstackedTimeSeries, timeIndex
 
 
+def kMedoidsFixed(candidates, n_clusters, fixedMedoids, n_iter=100):
+    """
+    k-medoids clustering in which some periods are fixed as medoids and only the
+    others are optimized, so the result always has exactly n_clusters distinct medoids.
+
+    Free medoids are first added greedily, each the period reducing the total
+    distance of all periods to their nearest medoid the most. Then periods are
+    assigned to their nearest medoid and each free medoid moved to the period of
+    its cluster with the smallest total distance to the others, until no medoid
+    moves. Finally, as in PAM, the single swap of a free medoid for another period
+    that lowers the total distance the most is made until none does. The total
+    distance never increases so each phase ends in at most n_iter rounds.
+
+    :param candidates: Periods to cluster, one per row. required
+    :type candidates: np.array
+
+    :param n_clusters: Number of clusters including the fixed ones. required
+    :type n_clusters: integer
+
+    :param fixedMedoids: Candidate indices which are kept as medoids. required
+    :type fixedMedoids: list
+
+    :returns: - **clusterCenters** -- The profile of each medoid, fixed medoids first.
+              - **clusterCenterIndices** -- The candidate index of each medoid.
+              - **clusterOrder** -- The cluster of each candidate period.
+    """
+    distances = euclidean_distances(candidates)
+    fixed = list(dict.fromkeys(int(i) for i in fixedMedoids))
+    n_clusters = min(n_clusters, len(candidates))
+
+    # build: greedily add the period saving the most distance to nearest medoids
+    medoids = list(fixed)
+    if medoids:
+        nearest = distances[:, medoids].min(axis=1)
+    else:
+        medoids.append(int(distances.sum(axis=0).argmin()))
+        nearest = distances[:, medoids[0]]
+    while len(medoids) < n_clusters:
+        gain = np.maximum(nearest[:, None] - distances, 0).sum(axis=0)
+        gain[medoids] = -1
+        medoid = int(gain.argmax())
+        medoids.append(medoid)
+        nearest = np.minimum(nearest, distances[:, medoid])
+
+    # alternate: assign to the nearest medoid, move free medoids to their cluster's medoid
+    for _ in range(n_iter):
+        clusterOrder = distances[:, medoids].argmin(axis=1)
+        newMedoids = list(medoids)
+        for c in range(len(fixed), len(medoids)):
+            members = np.flatnonzero(clusterOrder == c)
+            if len(members) == 0:
+                continue
+            newMedoids[c] = int(
+                members[distances[np.ix_(members, members)].sum(axis=1).argmin()]
+            )
+        if newMedoids == medoids:
+            break
+        medoids = newMedoids
+
+    # swap: replace the free medoid by the period lowering the total distance the most
+    for _ in range(n_iter):
+        bestCost, bestSwap = distances[:, medoids].min(axis=1).sum(), None
+        for c in range(len(fixed), len(medoids)):
+            others = medoids[:c] + medoids[c + 1 :]
+            if others:
+                otherNearest = distances[:, others].min(axis=1)
+            else:
+                otherNearest = np.full(len(distances), np.inf)
+            costs = np.minimum(otherNearest[:, None], distances).sum(axis=0)
+            costs[medoids] = np.inf
+            candidate = int(costs.argmin())
+            if costs[candidate] < bestCost * (1 - 1e-12):
+                bestCost, bestSwap = costs[candidate], (c, candidate)
+        if bestSwap is None:
+            break
+        medoids[bestSwap[0]] = bestSwap[1]
+
+    clusterOrder = distances[:, medoids].argmin(axis=1)
+    clusterCenters = [candidates[medoid] for medoid in medoids]
+    return clusterCenters, medoids, clusterOrder
+
+
 
 class TimeSeriesAggregation(object):
     """
@@ -93,6 +175,7 @@ class TimeSeriesAggregation(object):
         "k_maxoids",
         "hierarchical",
         "adjacent_periods",
+        "k_medoids_fixed",
     ]
 
     REPRESENTATION_METHODS = [
@@ -139,7 +222,11 @@ class TimeSeriesAggregation(object):
         addPeakMax=None,
         addMeanMin=None,
         addMeanMax=None,
-        addManual=None
+        addManual=None,
+        addRampMax=None,
+        addDeficitMax=None,
+        deficitPeriods=2,
+        fixedMedoids=None,
     ):
         """
         Initialize the periodly clusters.
@@ -172,6 +259,7 @@ class TimeSeriesAggregation(object):
             * 'k_maxoids'
             * 'hierarchical'
             * 'adjacent_periods'
+            * 'k_medoids_fixed': k-medoids keeping the periods in fixedMedoids as medoids
         :type clusterMethod: string
 
         :param evalSumPeriods: Boolean if in the clustering process also the averaged periodly values
@@ -271,6 +359,24 @@ class TimeSeriesAggregation(object):
         :param addMeanMax: List of column names where the period with the cumulative maximal value
             shall be added to the typical periods. optional, default: []
         :type addMeanMax: list
+
+        :param addRampMax: List of column names where the period with the largest change between two
+            consecutive time steps, up or down, shall be added to the typical periods. optional, default: []
+        :type addRampMax: list
+
+        :param addDeficitMax: List of column names where the run of deficitPeriods consecutive periods
+            furthest below the column's mean in total (e.g. a multi-day wind and solar lull) shall be
+            added to the typical periods, every period of the run. optional, default: []
+        :type addDeficitMax: list
+
+        :param deficitPeriods: Number of consecutive periods in a run for addDeficitMax. optional, default: 2
+        :type deficitPeriods: integer
+
+        :param fixedMedoids: List of period numbers which are kept as medoids of their own clusters when
+            clusterMethod is 'k_medoids_fixed'. Only the other noTypicalPeriods - len(fixedMedoids) medoids
+            are optimized, so every fixed period is one of exactly noTypicalPeriods distinct typical periods.
+            optional, default: []
+        :type fixedMedoids: list
         """
         if addMeanMin is None:
             addMeanMin = []
@@ -282,6 +388,12 @@ class TimeSeriesAggregation(object):
             addPeakMin = []
         if addManual is None:
             addManual = []
+        if addRampMax is None:
+            addRampMax = []
+        if addDeficitMax is None:
+            addDeficitMax = []
+        if fixedMedoids is None:
+            fixedMedoids = []
         if weightDict is None:
             weightDict = {}
         self.timeSeries = timeSeries
@@ -336,6 +448,14 @@ class TimeSeriesAggregation(object):
 
         self.addManual = addManual
 
+        self.addRampMax = addRampMax
+
+        self.addDeficitMax = addDeficitMax
+
+        self.deficitPeriods = deficitPeriods
+
+        self.fixedMedoids = fixedMedoids
+
         self._check_init_args()
 
         # internal attributes
@@ -387,6 +507,22 @@ class TimeSeriesAggregation(object):
                     + ' listed in "addMeanMax"'
                     + " does not occur as timeSeries column"
                 )
+        for peak in self.addRampMax:
+            if peak not in self.timeSeries.columns:
+                raise ValueError(
+                    peak
+                    + ' listed in "addRampMax"'
+                    + " does not occur as timeSeries column"
+                )
+        for peak in self.addDeficitMax:
+            if peak not in self.timeSeries.columns:
+                raise ValueError(
+                    peak
+                    + ' listed in "addDeficitMax"'
+                    + " does not occur as timeSeries column"
+                )
+        if not isinstance(self.deficitPeriods, int) or self.deficitPeriods < 1:
+            raise ValueError("deficitPeriods has to be positive integer")
 
         # derive resolution from date time index if not provided
         if self.resolution is None:
@@ -430,6 +566,13 @@ class TimeSeriesAggregation(object):
                 + "resulution does not result in an integer "
                 + "number of time steps per period"
             )
+        if self.addDeficitMax:
+            noPeriods = -(-len(self.timeSeries) // self.timeStepsPerPeriod)
+            if self.deficitPeriods > noPeriods:
+                raise ValueError(
+                    "deficitPeriods ({}) can not be more than the ".format(self.deficitPeriods)
+                    + "number of periods in the timeSeries ({})".format(noPeriods)
+                )
         if self.segmentation:
             if self.noSegments > self.timeStepsPerPeriod:
                 warnings.warn(
@@ -446,6 +589,17 @@ class TimeSeriesAggregation(object):
                 + "{}".format(self.CLUSTER_METHODS)
             )
 
+        # check fixedMedoids
+        if self.fixedMedoids:
+            if self.clusterMethod != "k_medoids_fixed":
+                raise ValueError(
+                    "fixedMedoids are only used with clusterMethod 'k_medoids_fixed'"
+                )
+            if len(set(self.fixedMedoids)) > self.noTypicalPeriods:
+                raise ValueError(
+                    "fixedMedoids can not be more than noTypicalPeriods"
+                )
+
         # check representationMethod
         if (
             self.representationMethod is not None
@@ -635,6 +789,9 @@ class TimeSeriesAggregation(object):
         addMeanMin=None,
         addMeanMax=None,
         addManual=None,
+        addRampMax=None,
+        addDeficitMax=None,
+        deficitPeriods=2,
     ):
         """
         Adds different extreme periods based on the to the clustered data,
@@ -683,71 +840,84 @@ class TimeSeriesAggregation(object):
 
         # check which extreme periods exist in the profile and add them to
         # self.extremePeriods dict
-        for column in self.timeSeries.columns:
-                
-            if column in addPeakMax:
-                stepNo = groupedSeries[column].max(axis=1).idxmax()
-                # add only if stepNo is not already in extremePeriods
-                # if it is not already a cluster center
-                if (
-                    stepNo not in extremePeriodNo
-                    and groupedSeries.loc[stepNo, :].values.tolist() not in ccList
-                ):
-                    max_col = self._append_col_with(column, " max.")
-                    self.extremePeriods[max_col] = {
-                        "stepNo": stepNo,
-                        "profile": groupedSeries.loc[stepNo, :].values,
-                        "column": column,
-                    }
-                    extremePeriodNo.append(stepNo)
-
-            if column in addPeakMin:
-                stepNo = groupedSeries[column].min(axis=1).idxmin()
-                # add only if stepNo is not already in extremePeriods
-                # if it is not already a cluster center
-                if (
-                    stepNo not in extremePeriodNo
-                    and groupedSeries.loc[stepNo, :].values.tolist() not in ccList
-                ):
-                    min_col = self._append_col_with(column, " min.")
-                    self.extremePeriods[min_col] = {
-                        "stepNo": stepNo,
-                        "profile": groupedSeries.loc[stepNo, :].values,
-                        "column": column,
-                    }
-                    extremePeriodNo.append(stepNo)
-
-            if column in addMeanMax:
-                stepNo = groupedSeries[column].mean(axis=1).idxmax()
-                # add only if stepNo is not already in extremePeriods
-                # if it is not already a cluster center
-                if (
-                    stepNo not in extremePeriodNo
-                    and groupedSeries.loc[stepNo, :].values.tolist() not in ccList
-                ):
-                    mean_max_col = self._append_col_with(column, " daily max.")
-                    self.extremePeriods[mean_max_col] = {
-                        "stepNo": stepNo,
-                        "profile": groupedSeries.loc[stepNo, :].values,
-                        "column": column,
-                    }
-                    extremePeriodNo.append(stepNo)
-
-            if column in addMeanMin:
-                stepNo = groupedSeries[column].mean(axis=1).idxmin()
-                # add only if stepNo is not already in extremePeriods and
-                # if it is not already a cluster center
-                if (
-                    stepNo not in extremePeriodNo
-                    and groupedSeries.loc[stepNo, :].values.tolist() not in ccList
-                ):
-                    mean_min_col = self._append_col_with(column, " daily min.")
-                    self.extremePeriods[mean_min_col] = {
-                        "stepNo": stepNo,
-                        "profile": groupedSeries.loc[stepNo, :].values,
-                        "column": column,
-                    }
-                    extremePeriodNo.append(stepNo)
+        selectors = [
+            (addPeakMax, " max."),
+            (addPeakMin, " min."),
+            (addMeanMax, " daily max."),
+            (addMeanMin, " daily min."),
+            (addRampMax or [], " ramp max."),
+            (addDeficitMax or [], " deficit"),
+        ]
+        requested = [
+            column
+            for column in self.timeSeries.columns
+            if any(column in selected for selected, _ in selectors)
+        ]
+        profiles = groupedSeries.values
+        if not requested:
+            requested_stats = {}
+        else:
+            # gather every requested column into one (periods, columns, steps) array so each
+            # statistic is a single reduction for all columns
+            positions = {column: [] for column in requested}
+            for i, column in enumerate(groupedSeries.columns.droplevel(-1)):
+                if column in positions:
+                    positions[column].append(i)
+            cube = profiles[:, np.array([positions[column] for column in requested])]
+
+            periodMeans = cube.mean(axis=2)
+            requested_stats = {
+                " max.": cube.max(axis=2).argmax(axis=0),
+                " min.": cube.min(axis=2).argmin(axis=0),
+                " daily max.": periodMeans.argmax(axis=0),
+                " daily min.": periodMeans.argmin(axis=0),
+            }
+            # ramps and deficits only for the columns asking for them
+            for suffix, selected in ((" ramp max.", addRampMax), (" deficit", addDeficitMax)):
+                requested_stats[suffix] = np.full(len(requested), -1)
+                if not selected:
+                    continue
+                idx = [r for r, column in enumerate(requested) if column in selected]
+                if suffix == " ramp max.":
+                    ramps = np.abs(np.diff(cube[:, idx], axis=2)).max(axis=2)
+                    requested_stats[suffix][idx] = ramps.argmax(axis=0)
+                else:
+                    # start of the run of deficitPeriods periods with the largest total shortfall
+                    # below the mean, as sliding window sums over cumulative sums
+                    shortfall = periodMeans[:, idx].mean(axis=0) - periodMeans[:, idx]
+                    cumulative = np.concatenate(
+                        (np.zeros((1, len(idx))), np.cumsum(shortfall, axis=0))
+                    )
+                    runs = cumulative[deficitPeriods:] - cumulative[:-deficitPeriods]
+                    requested_stats[suffix][idx] = runs.argmax(axis=0)
+
+        def addExtreme(name, period, column):
+            stepNo = groupedSeries.index[period]
+            profile = profiles[period]
+            # add only if stepNo is not already in extremePeriods
+            # if it is not already a cluster center
+            if stepNo not in extremePeriodNo and profile.tolist() not in ccList:
+                self.extremePeriods[name] = {
+                    "stepNo": stepNo,
+                    "profile": profile.copy(),
+                    "column": column,
+                }
+                extremePeriodNo.append(stepNo)
+
+        for r, column in enumerate(requested):
+            for selected, suffix in selectors:
+                if column not in selected:
+                    continue
+                period = requested_stats[suffix][r]
+                if suffix == " deficit":
+                    for i in range(deficitPeriods):
+                        addExtreme(
+                            self._append_col_with(column, f" deficit {i + 1}."),
+                            period + i,
+                            column,
+                        )
+                else:
+                    addExtreme(self._append_col_with(column, suffix), period, column)
 
         for periodType in self.extremePeriods:
             # get current related clusters of extreme periods
@@ -915,6 +1085,34 @@ class TimeSeriesAggregation(object):
                 )
         return typicalPeriods.values
 
+    def _aggregatePeriods(self, candidates, n_iter=100):
+        """
+        Clusters the candidate periods with the chosen clusterMethod.
+
+        :returns: - **clusterCenters** -- The profile of each cluster center.
+                  - **clusterCenterIndices** -- The candidate index of each medoid, if the method has medoids.
+                  - **clusterOrder** -- The cluster of each candidate period.
+        """
+        if self.clusterMethod == "k_medoids_fixed":
+            return kMedoidsFixed(
+                candidates,
+                n_clusters=self.noTypicalPeriods,
+                fixedMedoids=self.fixedMedoids,
+                n_iter=n_iter,
+            )
+
+        return aggregatePeriods(
+            candidates,
+            n_clusters=self.noTypicalPeriods,
+            n_iter=n_iter,
+            solver=self.solver,
+            clusterMethod=self.clusterMethod,
+            representationMethod=self.representationMethod,
+            representationDict=self.representationDict,
+            distributionPeriodWise=self.distributionPeriodWise,
+            timeStepsPerPeriod=self.timeStepsPerPeriod,
+        )
+
     def _clusterSortedPeriods(self, candidates, n_init=20):
         """
         Runs the clustering algorithms for the sorted profiles within the period
@@ -939,17 +1137,7 @@ class TimeSeriesAggregation(object):
             altClusterCenters,
             self.clusterCenterIndices,
             clusterOrders_C,
-        ) = aggregatePeriods(
-            sortedClusterValues,
-            n_clusters=self.noTypicalPeriods,
-            n_iter=30,
-            solver=self.solver,
-            clusterMethod=self.clusterMethod,
-            representationMethod=self.representationMethod,
-            representationDict=self.representationDict,
-            distributionPeriodWise=self.distributionPeriodWise,
-            timeStepsPerPeriod=self.timeStepsPerPeriod,
-        )
+        ) = self._aggregatePeriods(sortedClusterValues, n_iter=30)
 
         clusterCenters_C = []
 
@@ -1028,17 +1216,7 @@ class TimeSeriesAggregation(object):
                     self.clusterCenters,
                     self.clusterCenterIndices,
                     self._clusterOrder,
-                ) = aggregatePeriods(
-                    candidates,
-                    n_clusters=self.noTypicalPeriods,
-                    n_iter=100,
-                    solver=self.solver,
-                    clusterMethod=self.clusterMethod,
-                    representationMethod=self.representationMethod,
-                    representationDict=self.representationDict,
-                    distributionPeriodWise=self.distributionPeriodWise,
-                    timeStepsPerPeriod=self.timeStepsPerPeriod,
-                )
+                ) = self._aggregatePeriods(candidates, n_iter=100)
             else:
                 self.clusterCenters, self._clusterOrder = self._clusterSortedPeriods(
                     candidates
@@ -1065,7 +1243,10 @@ class TimeSeriesAggregation(object):
                 addPeakMax=self.addPeakMax,
                 addMeanMin=self.addMeanMin,
                 addMeanMax=self.addMeanMax,
-                addManual=self.addManual
+                addManual=self.addManual,
+                addRampMax=self.addRampMax,
+                addDeficitMax=self.addDeficitMax,
+                deficitPeriods=self.deficitPeriods,
             )
         else:
             self.extremeClusterIdx = []
@@ -4,6 +4,8 @@ Common utility scripts
 
 import os
 import yaml
+import sqlite3
+import urllib.request
 
 this_dir = os.path.realpath(os.path.dirname(__file__)) + "/"
 config: dict
@@ -44,4 +46,61 @@ def index_to_season(idx: int):
 def index_to_day(idx: int):
 
     d = idx * config['days_per_period'] - config['day_to_index']
-    return d
\ No newline at end of file
+    return d
+
+
+# SQLite URI opening a database read-only. Immutable skips file locking and change detection so
+# parallel processes share the OS page cache. The file must not be modified while open
+def readonly_uri(path: str) -> str:
+
+    return "file:" + urllib.request.pathname2url(os.path.abspath(path)) + "?mode=ro&immutable=1"
+
+
+# Attaches an input database read-only and memory-mapped. The connection must be opened with uri=True
+def attach_input(conn: sqlite3.Connection, path: str, name: str = 'dbin'):
+
+    conn.execute(f"ATTACH DATABASE ? AS {name}", (readonly_uri(path),))
+    conn.execute(f"PRAGMA {name}.mmap_size = {int(config['input_mmap_size'])}")
+
+
+# Copies an input database to a new file, only keeping rows of the given season tables
+# where the season is one of those given. Avoids copying the whole input then deleting most of it
+def copy_database(in_file: str, out_file: str, season_col: str, seasons: list[str], season_tables: list[str]):
+
+    if os.path.exists(out_file): os.remove(out_file)
+
+    conn = sqlite3.connect(out_file, uri=True)
+    attach_input(conn, in_file)
+    conn.execute("PRAGMA foreign_keys = 0;")
+
+    conn.execute("CREATE TEMP TABLE keep_season(season TEXT PRIMARY KEY)")
+    conn.executemany("INSERT OR IGNORE INTO temp.keep_season(season) VALUES(?)", [(season,) for season in seasons])
+
+    objects = conn.execute("""SELECT type, name, sql FROM dbin.sqlite_master
+                           WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'""").fetchall()
+    tables = [name for type, name, _ in objects if type == 'table']
+
+    # Tables first, then only the needed rows
+    for type, name, sql in objects:
+        if type == 'table': conn.execute(sql)
+
+    for table in tables:
+        if table in season_tables:
+            conn.execute(f"""INSERT INTO main.'{table}'
+                         SELECT t.* FROM dbin.'{table}' AS t CROSS JOIN temp.keep_season AS s
+                         ON t.{season_col} = s.season""")
+        else: conn.execute(f"INSERT INTO main.'{table}' SELECT * FROM dbin.'{table}'")
+
+    # Indices, triggers and views after the data is in
+    for type, name, sql in objects:
+        if type != 'table': conn.execute(sql)
+
+    if conn.execute("SELECT 1 FROM dbin.sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+        conn.execute("DELETE FROM main.sqlite_sequence")
+        conn.execute("INSERT INTO main.sqlite_sequence SELECT * FROM dbin.sqlite_sequence")
+
+    conn.execute(f"PRAGMA user_version = {conn.execute('PRAGMA dbin.user_version').fetchone()[0]}")
+
+    conn.commit()
+    conn.execute("DETACH DATABASE dbin")
+    conn.close()